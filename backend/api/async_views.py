@@ -0,0 +1,261 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import Value
+from django.http import Http404, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views import View
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotAuthenticated
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.views import exception_handler
+
+from api.authentication import AsyncTokenAuthentication
+from api.cache import aget_anonymous_data, aget_precomputed_response
+from api.conditional import arecipe_validators
+from api.search import aget_ingredient_index
+from api.serializers import (
+    FollowSerializer, IngredientSerializer, RecipeSerializer, TagSerializer,
+    get_recipes_limit, limited_recipes_prefetch
+)
+from api.views import (
+    CustomUserViewSet, IngredientViewSet, RecipeViewSet, TagViewSet
+)
+from kitchen.models import Ingredient, Recipe, Tag
+from users.models import User
+
+
+class AsyncReadView(View):
+    viewset = None
+    actions = None
+    action = None
+    fallback = None
+    authentication = AsyncTokenAuthentication()
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(
+            fallback=cls.viewset.as_view(cls.actions), **initkwargs
+        )
+        # Бюджеты запросов и CSRF проверяются так же, как у вьюсета.
+        view.cls = cls.viewset
+        view.actions = cls.actions
+        view.csrf_exempt = True
+        return view
+
+    async def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return await sync_to_async(self.fallback)(
+                request, *args, **kwargs
+            )
+        try:
+            self.request = await self.initialize_request(request)
+            return await super().dispatch(self.request, *args, **kwargs)
+        except (APIException, Http404, ObjectDoesNotExist) as exc:
+            return self.handle_exception(exc)
+
+    async def initialize_request(self, request):
+        drf_request = Request(request)
+        authenticated = await self.authentication.aauthenticate(request)
+        if authenticated is None:
+            drf_request.user, drf_request.auth = AnonymousUser(), None
+        else:
+            drf_request.user, drf_request.auth = authenticated
+        return drf_request
+
+    def handle_exception(self, exc):
+        if isinstance(exc, ObjectDoesNotExist):
+            exc = Http404()
+        response = exception_handler(exc, {'view': self})
+        rendered = self.render(response.data, response.status_code)
+        if response.status_code == status.HTTP_401_UNAUTHORIZED:
+            rendered['WWW-Authenticate'] = self.authentication.keyword
+        return rendered
+
+    def render(self, data, status_code=status.HTTP_200_OK):
+        return HttpResponse(
+            JSONRenderer().render(data),
+            status=status_code,
+            content_type='application/json'
+        )
+
+    def get_viewset(self):
+        return self.viewset(
+            request=self.request,
+            args=self.args,
+            kwargs=self.kwargs,
+            action=self.action,
+            format_kwarg=None
+        )
+
+
+class TagListView(AsyncReadView):
+    viewset = TagViewSet
+    actions = {'get': 'list'}
+
+    async def get(self, request):
+        precomputed = await aget_precomputed_response(
+            TagViewSet.precomputed_version, self.build_data
+        )
+        return precomputed.serve(request)
+
+    async def build_data(self):
+        return TagSerializer(
+            [tag async for tag in Tag.objects.all()], many=True
+        ).data
+
+
+class TagDetailView(AsyncReadView):
+    viewset = TagViewSet
+    actions = {'get': 'retrieve'}
+
+    async def get(self, request, pk):
+        return self.render(TagSerializer(await Tag.objects.aget(pk=pk)).data)
+
+
+class IngredientListView(AsyncReadView):
+    viewset = IngredientViewSet
+    actions = {'get': 'list'}
+
+    async def get(self, request):
+        name = request.query_params.get('name')
+        if name:
+            index = await aget_ingredient_index()
+            return self.render(
+                index.search(name, settings.INGREDIENT_SEARCH_LIMIT)
+            )
+        precomputed = await aget_precomputed_response(
+            IngredientViewSet.precomputed_version, self.build_data
+        )
+        return precomputed.serve(request)
+
+    async def build_data(self):
+        return IngredientSerializer(
+            [ingredient async for ingredient in Ingredient.objects.all()],
+            many=True
+        ).data
+
+
+class IngredientDetailView(AsyncReadView):
+    viewset = IngredientViewSet
+    actions = {'get': 'retrieve'}
+
+    async def get(self, request, pk):
+        return self.render(
+            IngredientSerializer(await Ingredient.objects.aget(pk=pk)).data
+        )
+
+
+class AsyncRecipeView(AsyncReadView):
+    viewset = RecipeViewSet
+
+    async def conditional(self, validators, build_data):
+        etag, last_modified = validators
+        response = get_conditional_response(
+            self.request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = self.render(await aget_anonymous_data(
+                self.request, 'recipes', build_data
+            ))
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    async def get_serializer_context(self, view):
+        context = {'request': self.request, 'format': None, 'view': view}
+        user = self.request.user
+        if user.is_authenticated:
+            context['followed_ids'] = {
+                author_id async for author_id in
+                user.follows.values_list('author_id', flat=True)
+            }
+        return context
+
+
+class RecipeListView(AsyncRecipeView):
+    actions = {'get': 'list', 'post': 'create'}
+    action = 'list'
+
+    async def get(self, request):
+        return await self.conditional(
+            await arecipe_validators(
+                request,
+                parts=sorted(request.query_params.lists()),
+                version_names=('recipes',)
+            ),
+            self.build_data
+        )
+
+    async def build_data(self):
+        view = self.get_viewset()
+        # Формы django-filter синхронны и могут проверять значения
+        # запросом к БД.
+        queryset = await sync_to_async(view.filter_queryset)(
+            view.get_queryset()
+        )
+        page = await view.paginator.apaginate_queryset(
+            queryset, self.request, view
+        )
+        serializer = RecipeSerializer(
+            page, many=True, context=await self.get_serializer_context(view)
+        )
+        return view.paginator.get_paginated_response(serializer.data).data
+
+
+class RecipeDetailView(AsyncRecipeView):
+    actions = {
+        'get': 'retrieve',
+        'put': 'update',
+        'patch': 'partial_update',
+        'delete': 'destroy',
+    }
+    action = 'retrieve'
+
+    async def get(self, request, pk):
+        updated_at = await Recipe.objects.filter(pk=pk).values_list(
+            'updated_at', flat=True
+        ).afirst()
+        if updated_at is None:
+            raise Http404
+        return await self.conditional(
+            await arecipe_validators(request, updated_at, parts=(pk,)),
+            self.build_data
+        )
+
+    async def build_data(self):
+        view = self.get_viewset()
+        recipe = await view.get_queryset().aget(pk=self.kwargs['pk'])
+        return RecipeSerializer(
+            recipe, context=await self.get_serializer_context(view)
+        ).data
+
+
+class SubscriptionsView(AsyncReadView):
+    viewset = CustomUserViewSet
+    actions = {'get': 'subscriptions'}
+    action = 'subscriptions'
+
+    async def get(self, request):
+        if not request.user.is_authenticated:
+            raise NotAuthenticated
+        view = self.get_viewset()
+        queryset = User.objects.filter(
+            followers__user=request.user
+        ).annotate(
+            is_subscribed=Value(True)
+        ).order_by('username').prefetch_related(
+            limited_recipes_prefetch(get_recipes_limit(request))
+        )
+        page = await view.paginator.apaginate_queryset(
+            queryset, request, view
+        )
+        serializer = FollowSerializer(
+            page, many=True, context={'request': request}
+        )
+        return self.render(
+            view.paginator.get_paginated_response(serializer.data).data
+        )
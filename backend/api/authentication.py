@@ -0,0 +1,47 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import (
+    TokenAuthentication, get_authorization_header
+)
+from rest_framework.exceptions import AuthenticationFailed
+
+
+class AsyncTokenAuthentication(TokenAuthentication):
+    def authenticate(self, request):
+        key = self.get_key(request)
+        if key is None:
+            return None
+        return self.authenticate_credentials(key)
+
+    async def aauthenticate(self, request):
+        key = self.get_key(request)
+        if key is None:
+            return None
+        model = self.get_model()
+        try:
+            token = await model.objects.select_related('user').aget(key=key)
+        except model.DoesNotExist:
+            raise AuthenticationFailed(_('Invalid token.'))
+        if not token.user.is_active:
+            raise AuthenticationFailed(_('User inactive or deleted.'))
+        return token.user, token
+
+    def get_key(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) == 1:
+            raise AuthenticationFailed(
+                _('Invalid token header. No credentials provided.')
+            )
+        if len(auth) > 2:
+            raise AuthenticationFailed(_(
+                'Invalid token header. '
+                'Token string should not contain spaces.'
+            ))
+        try:
+            return auth[1].decode()
+        except UnicodeError:
+            raise AuthenticationFailed(_(
+                'Invalid token header. '
+                'Token string should not contain invalid characters.'
+            ))
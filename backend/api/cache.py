@@ -0,0 +1,136 @@
+import gzip
+import hashlib
+import threading
+import time
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import quote_etag
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+
+def version_key(name):
+    return f'data-version:{name}'
+
+
+def get_version(name):
+    key = version_key(name)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+async def aget_version(name):
+    key = version_key(name)
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, time.time_ns(), None)
+        version = await cache.aget(key)
+    return version
+
+
+def bump_version(name):
+    # Новая версия берётся из часов, а не через incr: так после вытеснения
+    # ключа из кэша версия не может вернуться к уже выданному значению.
+    cache.set(version_key(name), time.time_ns(), None)
+
+
+def anonymous_response_key(request, version):
+    params = urlencode(sorted(
+        (key, value)
+        for key in request.query_params
+        for value in request.query_params.getlist(key)
+    ))
+    url = request.build_absolute_uri(request.path)
+    digest = hashlib.md5(f'{url}?{params}'.encode()).hexdigest()
+    return f'anonymous-response:{version}:{digest}'
+
+
+def cache_anonymous_response(version_name):
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            if request.user.is_authenticated:
+                return method(self, request, *args, **kwargs)
+            key = anonymous_response_key(request, get_version(version_name))
+            data = cache.get(key)
+            if data is not None:
+                return Response(data)
+            response = method(self, request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                cache.set(
+                    key, response.data, settings.ANONYMOUS_CACHE_TIMEOUT
+                )
+            return response
+        return wrapper
+    return decorator
+
+
+async def aget_anonymous_data(request, version_name, build_data):
+    if request.user.is_authenticated:
+        return await build_data()
+    key = anonymous_response_key(request, await aget_version(version_name))
+    data = await cache.aget(key)
+    if data is None:
+        data = await build_data()
+        await cache.aset(key, data, settings.ANONYMOUS_CACHE_TIMEOUT)
+    return data
+
+
+class PrecomputedResponse:
+    def __init__(self, version, data):
+        self.version = version
+        self.body = JSONRenderer().render(data)
+        self.gzipped = gzip.compress(self.body)
+        digest = hashlib.sha256(self.body).hexdigest()
+        self.etag = quote_etag(digest)
+        self.gzipped_etag = quote_etag(f'{digest}-gzip')
+
+    def serve(self, request):
+        if 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', ''):
+            body, etag = self.gzipped, self.gzipped_etag
+        else:
+            body, etag = self.body, self.etag
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = HttpResponse(body, content_type='application/json')
+            if body is self.gzipped:
+                response['Content-Encoding'] = 'gzip'
+        response['ETag'] = etag
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
+
+_precomputed = {}
+_precomputed_lock = threading.Lock()
+
+
+def get_precomputed_response(version_name, build_data):
+    version = get_version(version_name)
+    precomputed = _precomputed.get(version_name)
+    if precomputed is None or precomputed.version != version:
+        with _precomputed_lock:
+            precomputed = _precomputed.get(version_name)
+            if precomputed is None or precomputed.version != version:
+                precomputed = PrecomputedResponse(version, build_data())
+                _precomputed[version_name] = precomputed
+    return precomputed
+
+
+async def aget_precomputed_response(version_name, build_data):
+    # В цикле событий блокировка не нужна: в худшем случае ответ
+    # одновременно соберут два запроса.
+    version = await aget_version(version_name)
+    precomputed = _precomputed.get(version_name)
+    if precomputed is None or precomputed.version != version:
+        precomputed = PrecomputedResponse(version, await build_data())
+        _precomputed[version_name] = precomputed
+    return precomputed
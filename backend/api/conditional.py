@@ -0,0 +1,76 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from api.cache import aget_version, get_version
+
+RECIPE_DEPENDENCIES = 'recipe-dependencies'
+
+
+def user_state_version(user_id):
+    return f'user-state:{user_id}'
+
+
+def recipe_version_names(request, version_names=()):
+    names = [RECIPE_DEPENDENCIES, *version_names]
+    if request.user.is_authenticated:
+        names.append(user_state_version(request.user.pk))
+    return names
+
+
+def recipe_validators(request, updated_at=None, parts=(), version_names=()):
+    versions = [
+        get_version(name)
+        for name in recipe_version_names(request, version_names)
+    ]
+    return build_validators(request, versions, updated_at, parts)
+
+
+async def arecipe_validators(
+    request, updated_at=None, parts=(), version_names=()
+):
+    versions = [
+        await aget_version(name)
+        for name in recipe_version_names(request, version_names)
+    ]
+    return build_validators(request, versions, updated_at, parts)
+
+
+def build_validators(request, versions, updated_at, parts):
+    # Версии — метки времени в наносекундах, поэтому их можно учитывать
+    # и в ETag, и в Last-Modified. Счётчики избранного и корзины версии
+    # не меняют, поэтому ETag ещё и устаревает вместе с кэшем ответов.
+    epoch = int(time.time()) // settings.ANONYMOUS_CACHE_TIMEOUT
+    digest = hashlib.sha1(':'.join(
+        str(part)
+        for part in (request.user.pk, updated_at, epoch, *versions, *parts)
+    ).encode()).hexdigest()
+    timestamps = [version // 10 ** 9 for version in versions]
+    if updated_at is not None:
+        timestamps.append(int(updated_at.timestamp()))
+    return quote_etag(digest), max(timestamps)
+
+
+def conditional_recipe_response(get_validators):
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            validators = get_validators(self, request)
+            if validators is None:
+                return method(self, request, *args, **kwargs)
+            etag, last_modified = validators
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified
+            )
+            if response is not None:
+                return response
+            response = method(self, request, *args, **kwargs)
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+            return response
+        return wrapper
+    return decorator
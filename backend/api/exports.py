@@ -0,0 +1,93 @@
+import csv
+import hashlib
+import os
+from datetime import date
+from io import BytesIO
+
+from django.conf import settings
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen.canvas import Canvas
+
+PDF_FONT = 'ShoppingListFont'
+PDF_MARGIN = 50
+PDF_LINE_HEIGHT = 18
+CHUNK_SIZE = 64 * 1024
+
+
+def shopping_list_title():
+    return f'Список покупок на {date.today()}:'
+
+
+def shopping_list_etag(export_format, totals):
+    digest = hashlib.sha1(
+        f'{export_format}:{date.today()}'.encode()
+    )
+    for ingredient, amount in totals:
+        digest.update(f':{ingredient}-{amount}'.encode())
+    return f'"{digest.hexdigest()}"'
+
+
+def text_lines(ingredients):
+    for count, ingredient in enumerate(ingredients, 1):
+        yield '{}. {} - {}{}.'.format(count, *ingredient)
+
+
+def export_text(ingredients):
+    yield shopping_list_title()
+    for line in text_lines(ingredients):
+        yield '\n' + line
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def export_csv(ingredients):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('Ингредиент', 'Количество', 'Единица измерения'))
+    for ingredient in ingredients:
+        yield writer.writerow(ingredient)
+
+
+def get_pdf_font():
+    if PDF_FONT in pdfmetrics.getRegisteredFontNames():
+        return PDF_FONT
+    if not os.path.exists(settings.SHOPPING_LIST_FONT):
+        return 'Helvetica'
+    pdfmetrics.registerFont(TTFont(PDF_FONT, settings.SHOPPING_LIST_FONT))
+    return PDF_FONT
+
+
+def export_pdf(ingredients):
+    # PDF нельзя отдавать построчно: таблица ссылок пишется в конце файла.
+    # Строки всё равно читаются из БД по мере вывода, а готовый документ
+    # отдаётся частями.
+    buffer = BytesIO()
+    font = get_pdf_font()
+    canvas = Canvas(buffer, pagesize=A4)
+    width, height = A4
+    top = height - PDF_MARGIN
+    canvas.setFont(font, 14)
+    canvas.drawString(PDF_MARGIN, top, shopping_list_title())
+    position = top - PDF_LINE_HEIGHT * 2
+    canvas.setFont(font, 12)
+    for line in text_lines(ingredients):
+        if position < PDF_MARGIN:
+            canvas.showPage()
+            canvas.setFont(font, 12)
+            position = top
+        canvas.drawString(PDF_MARGIN, position, line)
+        position -= PDF_LINE_HEIGHT
+    canvas.save()
+    buffer.seek(0)
+    yield from iter(lambda: buffer.read(CHUNK_SIZE), b'')
+
+
+SHOPPING_LIST_EXPORTS = {
+    'txt': (export_text, 'text/plain; charset=utf-8'),
+    'csv': (export_csv, 'text/csv; charset=utf-8'),
+    'pdf': (export_pdf, 'application/pdf'),
+}
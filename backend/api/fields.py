@@ -0,0 +1,82 @@
+import binascii
+import hashlib
+import os
+import re
+from base64 import b64decode
+from tempfile import TemporaryFile
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+from rest_framework.fields import ImageField
+
+BASE64_HEADER = re.compile(r'data:[\w/.+-]*;base64,')
+# Кратно четырём, чтобы каждый кусок декодировался независимо.
+CHUNK_SIZE = 64 * 1024
+
+
+class StreamingBase64ImageField(ImageField):
+    allowed_formats = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif'}
+    upload_to = 'pictures/'
+    invalid_message = 'Загрузите корректное изображение в base64'
+    too_large_message = 'Размер изображения больше {limit} байт'
+    too_many_pixels_message = 'Изображение больше {limit} пикселей'
+
+    def to_internal_value(self, data):
+        if not isinstance(data, str) or not data:
+            raise ValidationError(self.invalid_message)
+        header = BASE64_HEADER.match(data)
+        start = header.end() if header else 0
+        # Размер проверяется по длине строки, до декодирования.
+        if (len(data) - start) * 3 // 4 > settings.MAX_IMAGE_BYTES:
+            raise ValidationError(self.too_large_message.format(
+                limit=settings.MAX_IMAGE_BYTES
+            ))
+        file = TemporaryFile()
+        try:
+            digest = self.decode_to_file(data, start, file)
+            extension = self.validate_image(file)
+        except Exception:
+            file.close()
+            raise
+        name = f'{digest}.{extension}'
+        if default_storage.exists(os.path.join(self.upload_to, name)):
+            file.close()
+            return os.path.join(self.upload_to, name)
+        file.seek(0)
+        return File(file, name=name)
+
+    def decode_to_file(self, data, start, file):
+        digest = hashlib.sha256()
+        for position in range(start, len(data), CHUNK_SIZE):
+            try:
+                chunk = b64decode(
+                    data[position:position + CHUNK_SIZE], validate=True
+                )
+            except (binascii.Error, ValueError):
+                raise ValidationError(self.invalid_message)
+            digest.update(chunk)
+            file.write(chunk)
+        return digest.hexdigest()
+
+    def validate_image(self, file):
+        try:
+            file.seek(0)
+            # Размеры читаются из заголовка, пиксели ещё не декодированы.
+            with Image.open(file) as image:
+                width, height = image.size
+                image_format = image.format
+                if width * height > settings.MAX_IMAGE_PIXELS:
+                    raise ValidationError(
+                        self.too_many_pixels_message.format(
+                            limit=settings.MAX_IMAGE_PIXELS
+                        )
+                    )
+                image.verify()
+        except (OSError, SyntaxError, Image.DecompressionBombError):
+            raise ValidationError(self.invalid_message)
+        if image_format not in self.allowed_formats:
+            raise ValidationError(self.invalid_message)
+        return self.allowed_formats[image_format]
@@ -1,7 +1,40 @@
+import threading
+
+from django import forms
+from django.db.models import Count
 from django_filters.rest_framework import FilterSet, filters
+from django_filters.widgets import QueryArrayWidget
 from rest_framework.filters import SearchFilter
 
+from api.cache import get_version
 from kitchen.models import Recipe, Tag
+from kitchen.search import search_recipes
+
+RecipeTag = Recipe.tags.through
+POPULAR_ORDERING = ('-favorites_count', '-pub_date', '-id')
+
+_tag_ids_lock = threading.Lock()
+_tag_ids = (None, {})
+
+
+def get_tag_ids(slugs):
+    global _tag_ids
+    version = get_version('tags')
+    if _tag_ids[0] != version:
+        with _tag_ids_lock:
+            if _tag_ids[0] != version:
+                _tag_ids = (
+                    version, dict(Tag.objects.values_list('slug', 'id'))
+                )
+    return {_tag_ids[1][slug] for slug in slugs if slug in _tag_ids[1]}
+
+
+class SlugListFilter(filters.Filter):
+    field_class = forms.Field
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('widget', QueryArrayWidget)
+        super().__init__(*args, **kwargs)
 
 
 class RecipeFilter(FilterSet):
@@ -9,17 +42,47 @@ class RecipeFilter(FilterSet):
         model = Recipe
         fields = ('tags', 'author',)
 
-    tags = filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        to_field_name='slug',
-        queryset=Tag.objects.all(),
+    tags = SlugListFilter(method='filter_tags')
+    tags_match = filters.ChoiceFilter(
+        choices=(('any', 'Любой из тегов'), ('all', 'Все теги')),
+        method='filter_tags_match'
     )
 
+    search = filters.CharFilter(method='filter_search')
+    ordering = filters.ChoiceFilter(
+        choices=(('popular', 'Сначала популярные'),),
+        method='filter_ordering'
+    )
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart'
     )
 
+    def filter_tags(self, queryset, name, value):
+        slugs = {
+            slug for values in value for slug in values.split(',') if slug
+        }
+        tag_ids = get_tag_ids(slugs)
+        match_all = self.form.cleaned_data.get('tags_match') == 'all'
+        if not tag_ids or (match_all and len(tag_ids) < len(slugs)):
+            return queryset.none()
+        # Подзапрос вместо join не размножает рецепты с несколькими тегами.
+        recipes = RecipeTag.objects.filter(tag_id__in=tag_ids)
+        if match_all:
+            recipes = recipes.values('recipe_id').annotate(
+                tags_count=Count('tag_id')
+            ).filter(tags_count=len(tag_ids))
+        return queryset.filter(pk__in=recipes.values('recipe_id'))
+
+    def filter_tags_match(self, queryset, name, value):
+        return queryset
+
+    def filter_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
+
+    def filter_ordering(self, queryset, name, value):
+        return queryset.order_by(*POPULAR_ORDERING)
+
     def filter_is_favorited(self, queryset, name, value):
         user = self.request.user
         if value and user.is_authenticated:
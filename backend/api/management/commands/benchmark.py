@@ -0,0 +1,286 @@
+import json
+import re
+import statistics
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.authtoken.models import Token
+
+from kitchen.models import Ingredient, Recipe, Tag
+from users.models import User
+
+IMAGE = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUl'
+    'EQVR42mP8z8BQDwAEhQGAhKmMIQAAAABJRU5ErkJggg=='
+)
+
+# Название, метод, адрес, тело запроса, запрос от имени пользователя.
+ROUTES = (
+    ('recipes-list-anonymous', 'get', '/api/recipes/', None, False),
+    ('recipes-list', 'get', '/api/recipes/', None, True),
+    ('recipes-list-tags', 'get', '/api/recipes/?tags={tag}', None, True),
+    ('recipes-list-author', 'get', '/api/recipes/?author={author}', None,
+     True),
+    ('recipes-list-favorited', 'get', '/api/recipes/?is_favorited=1', None,
+     True),
+    ('recipes-list-in-cart', 'get', '/api/recipes/?is_in_shopping_cart=1',
+     None, True),
+    ('recipes-list-cursor', 'get', '/api/recipes/?cursor=', None, True),
+    ('recipes-feed', 'get', '/api/recipes/feed/', None, True),
+    ('recipes-detail', 'get', '/api/recipes/{recipe}/', None, True),
+    ('recipes-create', 'post', '/api/recipes/', 'recipe_body', True),
+    ('recipes-update', 'patch', '/api/recipes/{own_recipe}/', 'recipe_body',
+     True),
+    ('recipes-favorite', 'post', '/api/recipes/{recipe}/favorite/', None,
+     True),
+    ('recipes-shopping-cart', 'post', '/api/recipes/{recipe}/shopping_cart/',
+     None, True),
+    ('recipes-bulk-favorite', 'post', '/api/recipes/bulk/favorite/',
+     'bulk_body', True),
+    ('recipes-bulk-shopping-cart', 'post',
+     '/api/recipes/bulk/shopping_cart/', 'bulk_body', True),
+    ('recipes-cart-summary', 'get', '/api/recipes/cart_summary/', None, True),
+    ('recipes-download-txt', 'get',
+     '/api/recipes/download_shopping_cart/?type=txt', None, True),
+    ('recipes-download-pdf', 'get',
+     '/api/recipes/download_shopping_cart/?type=pdf', None, True),
+    ('users-list', 'get', '/api/users/', None, True),
+    ('users-detail', 'get', '/api/users/{author}/', None, True),
+    ('users-me', 'get', '/api/users/me/', None, True),
+    ('users-subscribe', 'post', '/api/users/{author}/subscribe/', None, True),
+    ('users-subscriptions', 'get', '/api/users/subscriptions/?recipes_limit=3',
+     None, True),
+    ('tags-list', 'get', '/api/tags/', None, False),
+    ('ingredients-list', 'get', '/api/ingredients/', None, False),
+    ('ingredients-search', 'get', '/api/ingredients/?name={search}', None,
+     False),
+)
+METRICS = ('p50_ms', 'p95_ms', 'p99_ms', 'queries', 'memory_kb')
+# Задержка шумит сильнее остальных метрик, поэтому сравнивается p95.
+COMPARED_METRICS = ('p95_ms', 'queries', 'memory_kb')
+# Для быстрых маршрутов процентный порог меньше погрешности таймера.
+LATENCY_NOISE_MS = 1
+TRANSACTION_SQL = re.compile(
+    r'(BEGIN|COMMIT|ROLLBACK|(RELEASE |ROLLBACK TO )?SAVEPOINT)\b', re.I
+)
+
+
+def percentiles(samples):
+    cuts = statistics.quantiles(samples, n=100, method='inclusive')
+    return cuts[49], cuts[94], cuts[98]
+
+
+class Command(BaseCommand):
+    help = 'Замер скорости, числа запросов и памяти для маршрутов API'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=30)
+        parser.add_argument(
+            '--baseline',
+            type=Path,
+            default=settings.BASE_DIR / 'benchmark_baseline.json'
+        )
+        parser.add_argument(
+            '--save-baseline',
+            action='store_true',
+            help='Записать результаты как новый эталон'
+        )
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=settings.BENCHMARK_THRESHOLD,
+            help='Допустимое ухудшение относительно эталона, в процентах'
+        )
+        parser.add_argument(
+            '--route',
+            action='append',
+            dest='routes',
+            help='Запустить только указанные маршруты'
+        )
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 2:
+            raise CommandError('Нужно хотя бы две итерации')
+        routes = [
+            route for route in ROUTES
+            if not options['routes'] or route[0] in options['routes']
+        ]
+        context = self.get_context()
+        token = Token.objects.get_or_create(user=context['user'])[0]
+        clients = {
+            False: Client(),
+            True: Client(HTTP_AUTHORIZATION=f'Token {token.key}'),
+        }
+        results = {}
+        with tempfile.TemporaryDirectory() as media_root, override_settings(
+            ALLOWED_HOSTS=['testserver'], MEDIA_ROOT=media_root
+        ):
+            for name, method, url, payload, authenticated in routes:
+                results[name] = self.measure(
+                    clients[authenticated],
+                    method,
+                    url.format(**context),
+                    context.get(payload),
+                    options['iterations']
+                )
+                self.stdout.write(f'{name:28}' + '  '.join(
+                    f'{metric}={results[name][metric]}' for metric in METRICS
+                ))
+        if options['save_baseline']:
+            options['baseline'].write_text(
+                json.dumps(results, indent=2, sort_keys=True)
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f'Эталон сохранён в {options["baseline"]}'
+            ))
+            return
+        if options['baseline'].exists():
+            self.compare(
+                results,
+                json.loads(options['baseline'].read_text()),
+                options['threshold']
+            )
+
+    def get_context(self):
+        user = (
+            User.objects
+            .annotate(recipes_total=Count('recipes'))
+            .filter(recipes_total__gt=0, shopping_carts__isnull=False)
+            .order_by('-recipes_total', 'id')
+            .first()
+        )
+        if user is None:
+            raise CommandError(
+                'Сначала сгенерируйте данные командой generatedata'
+            )
+        recipe = (
+            Recipe.objects
+            .exclude(author=user)
+            .exclude(admirers__user=user)
+            .exclude(buyers__user=user)
+            .order_by('id')
+            .first()
+        )
+        author = (
+            User.objects
+            .exclude(pk=user.pk)
+            .exclude(followers__user=user)
+            .filter(recipes__isnull=False)
+            .order_by('id')
+            .first()
+        )
+        ingredients = list(Ingredient.objects.order_by('id')[:3])
+        tags = list(Tag.objects.order_by('id').values_list('id', 'slug'))
+        if None in (recipe, author):
+            raise CommandError('В данных не хватает рецептов или авторов')
+        return {
+            'user': user,
+            'recipe': recipe.pk,
+            'own_recipe': user.recipes.order_by('id').first().pk,
+            'author': author.pk,
+            'tag': tags[0][1],
+            'search': ingredients[0].name[:3],
+            'bulk_body': {'recipes': list(
+                Recipe.objects.order_by('-id').values_list('id', flat=True)[
+                    :settings.BULK_RECIPES_LIMIT
+                ]
+            )},
+            'recipe_body': {
+                'tags': [tags[0][0]],
+                'ingredients': [
+                    {'id': ingredient.pk, 'amount': 10}
+                    for ingredient in ingredients
+                ],
+                'name': 'Замер',
+                'image': IMAGE,
+                'text': 'Рецепт для замеров',
+                'cooking_time': 10,
+            },
+        }
+
+    def send(self, client, method, url, payload):
+        if payload is None:
+            response = getattr(client, method)(url)
+        else:
+            response = getattr(client, method)(
+                url, payload, content_type='application/json'
+            )
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response
+
+    def request(self, client, method, url, payload):
+        with CaptureQueriesContext(connection) as queries:
+            if method == 'get':
+                response = self.send(client, method, url, payload)
+            else:
+                # Изменения откатываются, чтобы каждая итерация
+                # выполнялась над одними и теми же данными.
+                with transaction.atomic():
+                    response = self.send(client, method, url, payload)
+                    transaction.set_rollback(True)
+        if response.status_code >= 400:
+            raise CommandError(
+                f'{method.upper()} {url}: ответ {response.status_code}'
+            )
+        # Управление транзакцией и точки сохранения появляются из-за
+        # транзакции замера, а не из-за самого маршрута.
+        return sum(
+            not TRANSACTION_SQL.match(query['sql'])
+            for query in queries.captured_queries
+        )
+
+    def measure(self, client, method, url, payload, iterations):
+        self.request(client, method, url, payload)
+        durations = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            queries = self.request(client, method, url, payload)
+            durations.append((time.perf_counter() - start) * 1000)
+        # Память замеряется отдельным запросом: tracemalloc замедляет код
+        # и исказил бы задержку.
+        tracemalloc.start()
+        try:
+            self.request(client, method, url, payload)
+            memory = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        p50, p95, p99 = percentiles(durations)
+        return {
+            'p50_ms': round(p50, 2),
+            'p95_ms': round(p95, 2),
+            'p99_ms': round(p99, 2),
+            'queries': queries,
+            'memory_kb': round(memory / 1024, 1),
+        }
+
+    def compare(self, results, baseline, threshold):
+        regressions = []
+        for name, result in results.items():
+            if name not in baseline:
+                continue
+            for metric in COMPARED_METRICS:
+                base = baseline[name][metric]
+                limit = base * (1 + threshold / 100)
+                if metric == 'queries':
+                    limit = base
+                elif metric.endswith('_ms'):
+                    limit = max(limit, base + LATENCY_NOISE_MS)
+                if result[metric] > limit:
+                    regressions.append(
+                        f'{name}: {metric} {result[metric]} '
+                        f'(эталон {base})'
+                    )
+        if regressions:
+            raise CommandError(
+                'Ухудшение больше допустимого:\n' + '\n'.join(regressions)
+            )
+        self.stdout.write(self.style.SUCCESS('Ухудшений нет'))
@@ -0,0 +1,145 @@
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+
+from kitchen.models import Ingredient, Recipe
+from users.models import User
+
+# Маршруты, у которых есть асинхронная версия.
+READ_ROUTES = (
+    ('recipes-list', '/api/recipes/'),
+    ('recipes-list-cursor', '/api/recipes/?cursor='),
+    ('recipes-detail', '/api/recipes/{recipe}/'),
+    ('tags-list', '/api/tags/'),
+    ('ingredients-search', '/api/ingredients/?name={search}'),
+    ('users-subscriptions', '/api/users/subscriptions/?recipes_limit=3'),
+)
+DEFAULT_TARGETS = (
+    'wsgi=http://backend:8000',
+    'asgi=http://backend-asgi:8000',
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнение пропускной способности WSGI- и ASGI-сервисов '
+        'на маршрутах чтения'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--target',
+            action='append',
+            dest='targets',
+            help='Сервис в виде имя=адрес, по умолчанию backend и '
+                 'backend-asgi из infra/docker-compose.yml'
+        )
+        parser.add_argument('--concurrency', type=int, default=64)
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=10,
+            help='Длительность замера одного маршрута, в секундах'
+        )
+        parser.add_argument('--timeout', type=float, default=30)
+        parser.add_argument(
+            '--route',
+            action='append',
+            dest='routes',
+            help='Запустить только указанные маршруты'
+        )
+
+    def handle(self, *args, **options):
+        targets = []
+        for target in options['targets'] or DEFAULT_TARGETS:
+            name, separator, url = target.partition('=')
+            if not separator or not url:
+                raise CommandError(f'Ожидается имя=адрес, получено {target}')
+            targets.append((name, url.rstrip('/')))
+        routes = [
+            route for route in READ_ROUTES
+            if not options['routes'] or route[0] in options['routes']
+        ]
+        context = self.get_context()
+        self.options = options
+        for route, url in routes:
+            results = {
+                name: self.measure(base + url.format(**context))
+                for name, base in targets
+            }
+            for name, result in results.items():
+                self.stdout.write(
+                    f'{route:22}{name:8}'
+                    f'rps={result["rps"]:.1f}  '
+                    f'p50_ms={result["p50_ms"]:.1f}  '
+                    f'p95_ms={result["p95_ms"]:.1f}  '
+                    f'errors={result["errors"]}'
+                )
+            base_name = targets[0][0]
+            for name, result in list(results.items())[1:]:
+                if results[base_name]['rps']:
+                    self.stdout.write(
+                        f'{route:22}{name}/{base_name} = '
+                        f'{result["rps"] / results[base_name]["rps"]:.2f}'
+                    )
+
+    def get_context(self):
+        user = User.objects.filter(
+            follows__isnull=False
+        ).order_by('id').first()
+        recipe = Recipe.objects.order_by('id').first()
+        ingredient = Ingredient.objects.order_by('id').first()
+        if None in (user, recipe, ingredient):
+            raise CommandError(
+                'Сначала сгенерируйте данные командой generatedata'
+            )
+        self.token = Token.objects.get_or_create(user=user)[0].key
+        return {'recipe': recipe.pk, 'search': ingredient.name[:3]}
+
+    def measure(self, url):
+        deadline = time.monotonic() + self.options['duration']
+        lock = threading.Lock()
+        durations = []
+        errors = [0]
+
+        def client():
+            # У каждого клиента своё соединение, как у отдельного браузера.
+            with requests.Session() as session:
+                session.headers['Authorization'] = f'Token {self.token}'
+                while time.monotonic() < deadline:
+                    start = time.perf_counter()
+                    try:
+                        response = session.get(
+                            url, timeout=self.options['timeout']
+                        )
+                        failed = response.status_code >= 400
+                    except requests.RequestException:
+                        failed = True
+                    elapsed = (time.perf_counter() - start) * 1000
+                    with lock:
+                        if failed:
+                            errors[0] += 1
+                        else:
+                            durations.append(elapsed)
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(self.options['concurrency']) as executor:
+            for _ in range(self.options['concurrency']):
+                executor.submit(client)
+        elapsed = time.monotonic() - started
+        if len(durations) < 2:
+            return {
+                'rps': 0, 'p50_ms': 0, 'p95_ms': 0, 'errors': errors[0]
+            }
+        cuts = statistics.quantiles(durations, n=100, method='inclusive')
+        return {
+            'rps': len(durations) / elapsed,
+            'p50_ms': cuts[49],
+            'p95_ms': cuts[94],
+            'errors': errors[0],
+        }
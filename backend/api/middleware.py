@@ -0,0 +1,111 @@
+import logging
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import (
+    iscoroutinefunction, markcoroutinefunction, sync_to_async
+)
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Управление транзакцией в бюджет не входит: SQLite и TestCase выполняют
+# эти команды явно, а PostgreSQL в обычном режиме — нет.
+TRANSACTION_STATEMENTS = (
+    'BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE'
+)
+
+
+def is_transaction_statement(sql):
+    return sql.lstrip().upper().startswith(TRANSACTION_STATEMENTS)
+
+
+class QueryCounter:
+    def __init__(self):
+        self.queries = []
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            if not is_transaction_statement(sql):
+                self.queries.append(sql)
+
+    def __len__(self):
+        return len(self.queries)
+
+
+def get_view_name(view_func, method):
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return None
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(method.lower(), method.lower())
+    return f'{view_class.__name__}.{action}'
+
+
+def get_query_budget(view_name):
+    return settings.QUERY_BUDGETS.get(view_name)
+
+
+class QueryBudgetMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        counter = QueryCounter()
+        start = time.perf_counter()
+        with self.watch(counter):
+            response = self.get_response(request)
+        return self.report(request, response, counter, start)
+
+    async def __acall__(self, request):
+        counter = QueryCounter()
+        start = time.perf_counter()
+        # Асинхронный ORM выполняет запросы в потоке sync_to_async,
+        # поэтому обёртки ставятся на соединения этого потока.
+        stack = await sync_to_async(self.watch)(counter)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        return self.report(request, response, counter, start)
+
+    @staticmethod
+    def watch(counter):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(counter))
+        return stack
+
+    def report(self, request, response, counter, start):
+        total = time.perf_counter() - start
+        # Всё, что не ожидание БД, — сериализация и рендеринг ответа.
+        serialization = max(total - counter.duration, 0)
+        response['X-DB-Queries'] = len(counter)
+        response['X-DB-Time'] = f'{counter.duration * 1000:.2f}'
+        response['X-Serialization-Time'] = f'{serialization * 1000:.2f}'
+        view_name = getattr(request, 'query_budget_view', None)
+        budget = get_query_budget(view_name)
+        if budget is not None and len(counter) > budget:
+            logger.warning(
+                'Query budget exceeded for %s %s (%s): %d > %d queries, '
+                '%.2f ms in DB',
+                request.method, request.path, view_name,
+                len(counter), budget, counter.duration * 1000
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget_view = get_view_name(view_func, request.method)
@@ -1,7 +1,284 @@
+import base64
+import binascii
+import hashlib
+import json
+from datetime import datetime
+from functools import partial
+
+from asgiref.sync import sync_to_async
 from django.conf import settings
-from rest_framework.pagination import PageNumberPagination
+from django.core.cache import cache
+from django.core.paginator import InvalidPage, Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from api.cache import get_version
+from api.conditional import user_state_version
+
+
+class KeysetPagination(BasePagination):
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    page_size_query_param = 'limit'
+    page_size = settings.PAGE_SIZE
+    ordering = ('-pub_date', '-id')
+    # Значения курсора приводятся к типу поля до того, как попасть в SQL.
+    position_types = {
+        'pub_date': datetime.fromisoformat,
+        'id': int,
+        'favorites_count': int,
+        'username': str,
+    }
+    invalid_cursor_message = 'Некорректный курсор'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.prepare(queryset, request, view)
+        if self.count_requested(request):
+            self.count = queryset.count()
+        return self.cut_page(list(self.get_page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        queryset = self.prepare(queryset, request, view)
+        if self.count_requested(request):
+            self.count = await queryset.acount()
+        return self.cut_page([
+            obj async for obj in self.get_page_queryset(queryset, request)
+        ])
+
+    def prepare(self, queryset, request, view):
+        self.request = request
+        self.ordering = getattr(view, 'cursor_ordering', self.ordering)
+        self.page_size = self.get_page_size(request)
+        self.count = None
+        return queryset.order_by(*self.ordering)
+
+    def count_requested(self, request):
+        return request.query_params.get(self.count_query_param) in (
+            'true', '1'
+        )
+
+    def get_page_queryset(self, queryset, request):
+        position = self.decode_cursor(request)
+        if position is not None:
+            queryset = queryset.filter(self.get_seek_filter(position))
+        return queryset[:self.page_size + 1]
+
+    def paginate_positions(self, get_page, request):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.count = None
+        return self.cut_page(
+            get_page(self.decode_cursor(request), self.page_size + 1)
+        )
+
+    def cut_page(self, results):
+        self.next_position = None
+        if len(results) > self.page_size:
+            results = results[:self.page_size]
+            self.next_position = self.get_position(results[-1])
+        return results
+
+    def get_page_size(self, request):
+        limit = request.query_params.get(self.page_size_query_param, '')
+        if limit.isdecimal() and limit.isascii() and int(limit) > 0:
+            return int(limit)
+        return self.page_size
+
+    def get_position(self, obj):
+        position = []
+        for field in self.ordering:
+            value = getattr(obj, field.lstrip('-'))
+            if isinstance(value, datetime):
+                value = value.isoformat()
+            position.append(value)
+        return position
+
+    def get_seek_filter(self, position):
+        seek = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            seek |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return seek
+
+    def encode_cursor(self, position):
+        return base64.urlsafe_b64encode(
+            json.dumps(position).encode()
+        ).decode()
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if (
+            not isinstance(position, list)
+            or len(position) != len(self.ordering)
+        ):
+            raise NotFound(self.invalid_cursor_message)
+        try:
+            return [
+                self.position_types[field.lstrip('-')](value)
+                for field, value in zip(self.ordering, position)
+            ]
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.next_position)
+        )
+
+    def get_paginated_response(self, data):
+        payload = {'next': self.get_next_link(), 'results': data}
+        if self.count is not None:
+            payload = {'count': self.count, **payload}
+        return Response(payload)
 
 
 class LimitPageNumberPagination(PageNumberPagination):
     page_size_query_param = 'limit'
     page_size = settings.PAGE_SIZE
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if KeysetPagination.cursor_query_param in request.query_params:
+            self.keyset = KeysetPagination()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if KeysetPagination.cursor_query_param in request.query_params:
+            self.keyset = KeysetPagination()
+            return await self.keyset.apaginate_queryset(
+                queryset, request, view
+            )
+        self.request = request
+        paginator = self.django_paginator_class(
+            queryset, self.get_page_size(request)
+        )
+        # Paginator посчитал бы объекты синхронно, поэтому число
+        # подставляется заранее.
+        paginator.count = await self.aget_count(queryset, request, view)
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(
+                page_number=page_number, message=str(exc)
+            ))
+        self.page.object_list = [obj async for obj in self.page.object_list]
+        return self.page.object_list
+
+    async def aget_count(self, queryset, request, view):
+        return await queryset.acount()
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class CountedPaginator(Paginator):
+    def __init__(self, object_list, per_page, get_count=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.get_count = get_count
+
+    @cached_property
+    def count(self):
+        if self.get_count is None:
+            return super().count
+        return self.get_count(self.object_list)
+
+
+class CachedCountPagination(LimitPageNumberPagination):
+    pagination_params = ('page', 'limit', 'cursor', 'count', 'ordering')
+    user_filters = ('is_favorited', 'is_in_shopping_cart')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count_is_exact = True
+        self.django_paginator_class = partial(
+            CountedPaginator,
+            get_count=partial(self.get_count, request=request, view=view)
+        )
+        return super().paginate_queryset(queryset, request, view)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        self.count_is_exact = True
+        return await super().apaginate_queryset(queryset, request, view)
+
+    async def aget_count(self, queryset, request, view):
+        # Число берётся из кэша или статистики PostgreSQL, и этот путь
+        # остаётся синхронным.
+        return await sync_to_async(self.get_count)(queryset, request, view)
+
+    def get_filter_signature(self, request):
+        return sorted(
+            (key, value)
+            for key, values in request.query_params.lists()
+            if key not in self.pagination_params
+            for value in values
+        )
+
+    def get_count(self, queryset, request, view):
+        signature = self.get_filter_signature(request)
+        if not signature:
+            estimate = self.get_estimated_count(queryset)
+            if estimate is not None:
+                self.count_is_exact = False
+                return estimate
+        versions = [get_version(view.count_cache_version)]
+        user = request.user
+        if user.is_authenticated and any(
+            key in self.user_filters for key, value in signature
+        ):
+            versions += [user.pk, get_version(user_state_version(user.pk))]
+        digest = hashlib.sha1(
+            json.dumps([versions, signature]).encode()
+        ).hexdigest()
+        key = f'count:{queryset.model._meta.label_lower}:{digest}'
+        count = cache.get(key)
+        if count is None:
+            count = queryset.count()
+            cache.set(key, count, settings.COUNT_CACHE_TIMEOUT)
+        return count
+
+    def get_estimated_count(self, queryset):
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class '
+                'WHERE oid = %s::regclass',
+                [queryset.model._meta.db_table]
+            )
+            row = cursor.fetchone()
+        if row is None or row[0] < settings.APPROXIMATE_COUNT_THRESHOLD:
+            return None
+        return row[0]
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if self.keyset is None:
+            response.data = {
+                'count': response.data['count'],
+                'count_is_exact': self.count_is_exact,
+                **response.data
+            }
+        return response
@@ -0,0 +1,331 @@
+import threading
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from functools import partial
+from itertools import count, groupby
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from api.cache import aget_version, get_version
+from kitchen.models import Ingredient, RecipeIngredient
+
+TRIGRAM_SIMILARITY = 0.3
+MATCH_SEQUENCE_KEY = 'recipe-match:sequence'
+
+
+def normalize(text):
+    return text.casefold().replace('ё', 'е').strip()
+
+
+def trigrams(text):
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class IngredientIndex:
+    def __init__(self, ingredients):
+        self.items = []
+        self.keys = []
+        for ingredient in sorted(
+            ingredients, key=lambda item: normalize(item['name'])
+        ):
+            self.items.append(ingredient)
+            self.keys.append(normalize(ingredient['name']))
+        self.key_trigrams = [trigrams(key) for key in self.keys]
+        self.postings = defaultdict(set)
+        for position, grams in enumerate(self.key_trigrams):
+            for gram in grams:
+                self.postings[gram].add(position)
+        self.short_postings = defaultdict(set)
+        for position, key in enumerate(self.keys):
+            for size in (1, 2):
+                for start in range(len(key) - size + 1):
+                    self.short_postings[key[start:start + size]].add(position)
+
+    def prefix_matches(self, query):
+        position = bisect_left(self.keys, query)
+        while (
+            position < len(self.keys)
+            and self.keys[position].startswith(query)
+        ):
+            yield position
+            position += 1
+
+    def substring_matches(self, query):
+        if len(query) < 3:
+            candidates = self.short_postings.get(query, ())
+        else:
+            inner = [query[i:i + 3] for i in range(len(query) - 2)]
+            candidates = set.intersection(
+                *(self.postings.get(gram, set()) for gram in inner)
+            )
+        found = (
+            (self.keys[position].find(query), position)
+            for position in candidates
+        )
+        return [
+            position for offset, position in sorted(
+                match for match in found if match[0] > 0
+            )
+        ]
+
+    def similar_matches(self, query):
+        query_trigrams = trigrams(query)
+        shared = Counter()
+        for gram in query_trigrams:
+            shared.update(self.postings.get(gram, ()))
+        scored = []
+        for position, common in shared.items():
+            similarity = common / (
+                len(query_trigrams) + len(self.key_trigrams[position]) - common
+            )
+            if similarity >= TRIGRAM_SIMILARITY:
+                scored.append((-similarity, position))
+        return [position for similarity, position in sorted(scored)]
+
+    def search(self, query, limit):
+        query = normalize(query)
+        if not query:
+            return []
+        result = []
+        seen = set()
+        for matches in (
+            self.prefix_matches, self.substring_matches, self.similar_matches
+        ):
+            for position in matches(query):
+                if position in seen:
+                    continue
+                seen.add(position)
+                result.append(self.items[position])
+                if len(result) >= limit:
+                    return result
+        return result
+
+
+_lock = threading.Lock()
+_index = None
+_index_version = None
+
+
+def get_ingredient_index():
+    global _index, _index_version
+    version = get_version('ingredients')
+    if _index is None or _index_version != version:
+        with _lock:
+            if _index is None or _index_version != version:
+                _index = IngredientIndex(
+                    Ingredient.objects.values(
+                        'id', 'name', 'measurement_unit'
+                    )
+                )
+                _index_version = version
+    return _index
+
+
+async def aget_ingredient_index():
+    global _index, _index_version
+    version = await aget_version('ingredients')
+    if _index is None or _index_version != version:
+        ingredients = [
+            ingredient async for ingredient in Ingredient.objects.values(
+                'id', 'name', 'measurement_unit'
+            )
+        ]
+        _index = IngredientIndex(ingredients)
+        _index_version = version
+    return _index
+
+
+def bitset(positions, size):
+    buffer = bytearray((size >> 3) + 1)
+    for position in positions:
+        buffer[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+def iter_bits(bits):
+    # От старших битов к младшим: новые рецепты идут первыми.
+    while bits:
+        position = bits.bit_length() - 1
+        yield position
+        bits ^= 1 << position
+
+
+class RecipeMatchIndex:
+    # Номер бита в каждом множестве — id рецепта. Число ингредиентов
+    # рецепта хранится побитовыми срезами: size_slices[j] содержит рецепты,
+    # у которых в числе ингредиентов установлен j-й бит.
+    def __init__(self, generation, sequence, rows):
+        self.generation = generation
+        self.sequence = sequence
+        self.recipes = {}
+        by_ingredient = defaultdict(list)
+        for recipe_id, ingredient_id in rows:
+            self.recipes.setdefault(recipe_id, []).append(ingredient_id)
+            by_ingredient[ingredient_id].append(recipe_id)
+        size = max(self.recipes, default=0)
+        self.postings = defaultdict(int, {
+            ingredient_id: bitset(recipe_ids, size)
+            for ingredient_id, recipe_ids in by_ingredient.items()
+        })
+        longest = max(map(len, self.recipes.values()), default=0)
+        self.size_slices = [
+            bitset(
+                (
+                    recipe_id
+                    for recipe_id, ingredients in self.recipes.items()
+                    if len(ingredients) >> bit & 1
+                ),
+                size
+            )
+            for bit in range(longest.bit_length())
+        ]
+        self.recipes = {
+            recipe_id: tuple(ingredients)
+            for recipe_id, ingredients in self.recipes.items()
+        }
+
+    def update(self, recipe_id, ingredients):
+        mask = 1 << recipe_id
+        for ingredient_id in self.recipes.pop(recipe_id, ()):
+            self.postings[ingredient_id] &= ~mask
+        for ingredient_id in ingredients:
+            self.postings[ingredient_id] |= mask
+        if ingredients:
+            self.recipes[recipe_id] = tuple(ingredients)
+        while len(ingredients).bit_length() > len(self.size_slices):
+            self.size_slices.append(0)
+        for bit, bits in enumerate(self.size_slices):
+            if len(ingredients) >> bit & 1:
+                self.size_slices[bit] = bits | mask
+            else:
+                self.size_slices[bit] = bits & ~mask
+
+    def missing_groups(self, have, exclude=()):
+        candidates = 0
+        matched = []
+        for ingredient_id in set(have):
+            bits = self.postings.get(ingredient_id, 0)
+            candidates |= bits
+            # Побитовый сумматор: matched — число совпавших ингредиентов
+            # для всех рецептов сразу.
+            for position, counter in enumerate(matched):
+                matched[position], bits = counter ^ bits, counter & bits
+            if bits:
+                matched.append(bits)
+        for ingredient_id in exclude:
+            candidates &= ~self.postings.get(ingredient_id, 0)
+        # missing = размер рецепта - matched, тоже побитово, с заёмом.
+        missing = []
+        borrow = 0
+        for position, size_bits in enumerate(self.size_slices):
+            bits = matched[position] if position < len(matched) else 0
+            missing.append((size_bits ^ bits ^ borrow) & candidates)
+            borrow = (~size_bits & (bits | borrow)) | (bits & borrow)
+        remaining = candidates
+        for value in count():
+            if not remaining:
+                return
+            group = remaining
+            for position, bits in enumerate(missing):
+                group &= bits if value >> position & 1 else ~bits
+            if group:
+                yield value, group
+                remaining &= ~group
+
+    def match(self, have, exclude=(), offset=0, limit=None):
+        total = 0
+        page = []
+        for missing, group in self.missing_groups(have, exclude):
+            size = bin(group).count('1')
+            skip = min(max(offset - total, 0), size)
+            total += size
+            if skip == size or (limit is not None and len(page) >= limit):
+                continue
+            for position, recipe_id in enumerate(iter_bits(group)):
+                if position < skip:
+                    continue
+                if limit is not None and len(page) >= limit:
+                    break
+                page.append((recipe_id, missing))
+        return total, page
+
+
+def log_recipe_changes(recipe_ids):
+    transaction.on_commit(partial(write_recipe_changes, list(recipe_ids)))
+
+
+def write_recipe_changes(recipe_ids):
+    cache.add(MATCH_SEQUENCE_KEY, 0, None)
+    try:
+        sequence = cache.incr(MATCH_SEQUENCE_KEY)
+    except ValueError:
+        cache.add(MATCH_SEQUENCE_KEY, 1, None)
+        sequence = cache.get(MATCH_SEQUENCE_KEY)
+    cache.set(
+        f'recipe-match:change:{sequence}',
+        recipe_ids,
+        settings.RECIPE_MATCH_LOG_TIMEOUT
+    )
+
+
+def recipe_ingredient_rows(recipe_ids=None):
+    rows = RecipeIngredient.objects.order_by()
+    if recipe_ids is not None:
+        rows = rows.filter(recipe_id__in=recipe_ids).order_by('recipe_id')
+    return rows.values_list('recipe_id', 'name_id').iterator()
+
+
+_match_lock = threading.Lock()
+_match_index = None
+
+
+def sync_recipe_match_index():
+    global _match_index
+    generation = get_version('recipe-match')
+    cache.add(MATCH_SEQUENCE_KEY, 0, None)
+    sequence = cache.get(MATCH_SEQUENCE_KEY, 0)
+    index = _match_index
+    if (
+        index is not None
+        and index.generation == generation
+        and index.sequence < sequence
+    ):
+        changes = cache.get_many([
+            f'recipe-match:change:{number}'
+            for number in range(index.sequence + 1, sequence + 1)
+        ])
+        if len(changes) == sequence - index.sequence:
+            changed = {
+                recipe_id
+                for recipe_ids in changes.values()
+                for recipe_id in recipe_ids
+            }
+            rows = {
+                recipe_id: [ingredient for recipe, ingredient in group]
+                for recipe_id, group in groupby(
+                    recipe_ingredient_rows(changed), lambda row: row[0]
+                )
+            }
+            for recipe_id in changed:
+                index.update(recipe_id, rows.get(recipe_id, []))
+            index.sequence = sequence
+            return index
+    if (
+        index is None
+        or index.generation != generation
+        or index.sequence != sequence
+    ):
+        # Журнал изменений вытеснен из кэша или сменилось поколение:
+        # индекс строится заново.
+        _match_index = RecipeMatchIndex(
+            generation, sequence, recipe_ingredient_rows()
+        )
+    return _match_index
+
+
+def match_recipes(have, exclude=(), offset=0, limit=None):
+    with _match_lock:
+        return sync_recipe_match_index().match(have, exclude, offset, limit)
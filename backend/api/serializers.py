@@ -1,22 +1,58 @@
+from django.conf import settings
+from django.core.files.storage import default_storage
 from django.core.validators import MinValueValidator
 from django.db import transaction
-from django.db.models import F
+from django.db.models import Prefetch, prefetch_related_objects
 from djoser.serializers import UserSerializer
-from drf_extra_fields.fields import Base64ImageField
 from rest_framework.serializers import (
-    BooleanField, IntegerField, ModelSerializer, PrimaryKeyRelatedField,
-    SerializerMethodField, ValidationError
+    BooleanField, IntegerField, ListField, ModelSerializer,
+    PrimaryKeyRelatedField, ReadOnlyField, Serializer, SerializerMethodField,
+    ValidationError
 )
 from rest_framework.validators import UniqueTogetherValidator
 from rest_framework import status
 
+from api.fields import StreamingBase64ImageField
+from api.search import log_recipe_changes
+from kitchen.cart import change_recipe_in_carts
+from kitchen.counters import adjust_counters
+from kitchen.feed import fan_out_recipe
+from kitchen.images import schedule_image_processing
 from kitchen.models import (
     Favorite, Ingredient, Recipe,
-    RecipeIngredient, ShoppingCart, Tag
+    RecipeIngredient, ShoppingCart, ShoppingCartTotal, Tag
 )
+from kitchen.search import update_search_documents
 from users.models import Follow, User
 
 
+COUNTER_FIELDS = ('favorites_count', 'in_carts_count')
+SELF_FOLLOW_MESSAGE = 'Вы не можете подписаться на самого себя!'
+
+
+def get_recipes_limit(request):
+    recipes_limit = request.query_params.get('recipes_limit', '')
+    if recipes_limit.isdecimal() and recipes_limit.isascii():
+        return int(recipes_limit)
+    return None
+
+
+def limited_recipes_prefetch(recipes_limit):
+    recipes = Recipe.objects.order_by('-pub_date', '-id')
+    if recipes_limit is not None:
+        recipes = recipes[:recipes_limit]
+    return Prefetch('recipes', queryset=recipes, to_attr='limited_recipes')
+
+
+def recipe_ingredients_prefetch():
+    return Prefetch(
+        'recipeingredients',
+        queryset=RecipeIngredient.objects.select_related(
+            'name'
+        ).order_by('name__name')
+    )
+
+
 class CustomUserSerializer(UserSerializer):
     is_subscribed = SerializerMethodField()
 
@@ -26,36 +62,39 @@ class CustomUserSerializer(UserSerializer):
                   'last_name', 'email', 'is_subscribed')
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
-        return (
-            request and request.user.is_authenticated
-            and obj.followers.filter(user=request.user).exists()
-        )
+        if not request or not request.user.is_authenticated:
+            return False
+        if obj.pk == request.user.pk:
+            return False
+        followed_ids = self.context.get('followed_ids')
+        if followed_ids is not None:
+            return obj.pk in followed_ids
+        return obj.followers.filter(user=request.user).exists()
 
 
 class FollowSerializer(CustomUserSerializer):
     recipes = SerializerMethodField()
-    recipes_count = SerializerMethodField()
 
     class Meta:
         model = User
         fields = ('email', 'id',
                   'username', 'first_name',
                   'last_name', 'is_subscribed',
-                  'recipes', 'recipes_count')
-
-    def get_recipes(self, obj, recipes_limit=None):
-        recipes = obj.recipes.all()
-        request = self.context.get('request')
-        if request.query_params.get('recipes_limit'):
-            recipes_limit = int(request.query_params.get('recipes_limit'))
-            recipes = recipes[:recipes_limit]
+                  'recipes', 'recipes_count', 'followers_count')
+
+    def get_recipes(self, obj):
+        recipes = getattr(obj, 'limited_recipes', None)
+        if recipes is None:
+            recipes = obj.recipes.all()
+            recipes_limit = get_recipes_limit(self.context.get('request'))
+            if recipes_limit is not None:
+                recipes = recipes[:recipes_limit]
         serializer = RecipeInFollowSerializer(recipes, many=True)
         return serializer.data
 
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
-
 
 class FollowCreateSerializer(ModelSerializer):
     class Meta:
@@ -74,7 +113,7 @@ class FollowCreateSerializer(ModelSerializer):
         user = data.get('user')
         if user == author:
             raise ValidationError(
-                detail='Вы не можете подписаться на самого себя!',
+                detail=SELF_FOLLOW_MESSAGE,
                 code=status.HTTP_400_BAD_REQUEST
             )
         return data
@@ -104,16 +143,40 @@ class RecipeIngredientsCUDSerializer(ModelSerializer):
         fields = ('id', 'amount')
 
 
+class RecipeIngredientSerializer(ModelSerializer):
+    id = ReadOnlyField(source='name.id')
+    name = ReadOnlyField(source='name.name')
+    measurement_unit = ReadOnlyField(source='name.measurement_unit')
+
+    class Meta:
+        model = RecipeIngredient
+        fields = ('id', 'name', 'measurement_unit', 'amount')
+
+
 class RecipeInFollowSerializer(ModelSerializer):
+    image_variants = SerializerMethodField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
+
+    def get_image_variants(self, recipe):
+        request = self.context.get('request')
+        urls = {}
+        for variant, name in recipe.image_variants.items():
+            urls[variant] = default_storage.url(name)
+            if request is not None:
+                urls[variant] = request.build_absolute_uri(urls[variant])
+        return urls
 
 
 class RecipeSerializer(RecipeInFollowSerializer):
     tags = TagSerializer(many=True)
-    author = UserSerializer()
-    ingredients = SerializerMethodField()
+    author = CustomUserSerializer()
+    ingredients = RecipeIngredientSerializer(
+        source='recipeingredients',
+        many=True
+    )
     is_favorited = BooleanField(read_only=True)
     is_in_shopping_cart = BooleanField(read_only=True)
 
@@ -128,17 +191,19 @@ class RecipeSerializer(RecipeInFollowSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_variants',
             'text',
-            'cooking_time'
+            'cooking_time',
+            'favorites_count',
+            'in_carts_count'
         )
 
-    def get_ingredients(self, recipe):
-        return recipe.ingredients.values(
-            'id',
-            'name',
-            'measurement_unit',
-            amount=F('recipeingredients__amount')
-        )
+
+class RecipeMatchSerializer(RecipeSerializer):
+    missing_count = IntegerField(read_only=True)
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ('missing_count',)
 
 
 class RecipeCUDSerializer(RecipeInFollowSerializer):
@@ -148,7 +213,7 @@ class RecipeCUDSerializer(RecipeInFollowSerializer):
         1,
         message='Время приготовления не менее 1 минуты'
     ),))
-    image = Base64ImageField()
+    image = StreamingBase64ImageField()
 
     class Meta:
         model = Recipe
@@ -187,6 +252,11 @@ class RecipeCUDSerializer(RecipeInFollowSerializer):
         )
         recipe.tags.set(tags)
         self.recipe_ingredient_create(ingredients, RecipeIngredient, recipe)
+        update_search_documents([recipe.id])
+        log_recipe_changes([recipe.id])
+        adjust_counters(User, [recipe.author_id], recipes_count=1)
+        fan_out_recipe(recipe)
+        schedule_image_processing(recipe)
         return recipe
 
     @transaction.atomic
@@ -194,13 +264,33 @@ class RecipeCUDSerializer(RecipeInFollowSerializer):
         tags_data = validated_data.pop('tags')
         instance.tags.set(tags_data)
         ingredients = validated_data.pop('ingredients')
+        old_amounts = dict(
+            instance.recipeingredients.values_list('name', 'amount')
+        )
         instance.ingredients.clear()
         self.recipe_ingredient_create(
             ingredients,
             RecipeIngredient,
             instance
         )
-        return super().update(instance, validated_data)
+        change_recipe_in_carts(
+            instance.id,
+            old_amounts,
+            {
+                ingredient['id'].id: ingredient['amount']
+                for ingredient in ingredients
+            }
+        )
+        if validated_data.get('image', instance.image.name) != (
+            instance.image.name
+        ):
+            instance.image_variants = {}
+        instance = super().update(instance, validated_data)
+        update_search_documents([instance.id])
+        log_recipe_changes([instance.id])
+        if not instance.image_variants:
+            schedule_image_processing(instance)
+        return instance
 
     @staticmethod
     def recipe_ingredient_create(ingredients, model, recipe):
@@ -220,6 +310,14 @@ class RecipeCUDSerializer(RecipeInFollowSerializer):
         instance.is_in_shopping_cart = user.shopping_carts.filter(
             recipe=instance
         ).exists()
+        prefetch_related_objects(
+            [instance],
+            'tags',
+            recipe_ingredients_prefetch()
+        )
+        deferred = instance.get_deferred_fields() & set(COUNTER_FIELDS)
+        if deferred:
+            instance.refresh_from_db(fields=deferred)
         return RecipeSerializer(instance, context=self.context).data
 
 
@@ -236,6 +334,16 @@ class ShoppingCartSerializer(ModelSerializer):
         ]
 
 
+class ShoppingCartTotalSerializer(ModelSerializer):
+    id = ReadOnlyField(source='ingredient.id')
+    name = ReadOnlyField(source='ingredient.name')
+    measurement_unit = ReadOnlyField(source='ingredient.measurement_unit')
+
+    class Meta:
+        model = ShoppingCartTotal
+        fields = ('id', 'name', 'measurement_unit', 'amount')
+
+
 class FavoriteSerializer(ModelSerializer):
     class Meta:
         model = Favorite
@@ -247,3 +355,11 @@ class FavoriteSerializer(ModelSerializer):
                 message='Рецепт уже добавлен в избранное'
             )
         ]
+
+
+class RecipeIdsSerializer(Serializer):
+    recipes = ListField(
+        child=IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_RECIPES_LIMIT
+    )
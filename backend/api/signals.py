@@ -0,0 +1,68 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from api.cache import bump_version
+from api.conditional import RECIPE_DEPENDENCIES, user_state_version
+from api.search import log_recipe_changes
+from kitchen.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, Tag)
+from kitchen.search import update_search_documents
+from users.models import Follow, User
+
+
+def bump_on_commit(*names):
+    for name in names:
+        transaction.on_commit(partial(bump_version, name))
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredients_changed(**kwargs):
+    bump_on_commit('ingredients', 'recipes', RECIPE_DEPENDENCIES)
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_renamed(instance, created, **kwargs):
+    if not created:
+        update_search_documents(
+            instance.recipeingredients.values_list('recipe_id', flat=True)
+        )
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipes_changed(signal, **kwargs):
+    if signal is post_delete and kwargs['sender'] is Recipe:
+        bump_on_commit('recipes', RECIPE_DEPENDENCIES)
+    else:
+        bump_on_commit('recipes')
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def recipe_ingredients_changed(instance, **kwargs):
+    log_recipe_changes([
+        instance.id if isinstance(instance, Recipe) else instance.recipe_id
+    ])
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def tags_changed(**kwargs):
+    bump_on_commit('tags', 'recipes', RECIPE_DEPENDENCIES)
+
+
+@receiver((post_save, post_delete), sender=User)
+def users_changed(update_fields=None, **kwargs):
+    if update_fields and set(update_fields) == {'last_login'}:
+        return
+    bump_on_commit('recipes', RECIPE_DEPENDENCIES)
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+@receiver((post_save, post_delete), sender=ShoppingCart)
+@receiver((post_save, post_delete), sender=Follow)
+def user_state_changed(instance, **kwargs):
+    bump_on_commit(user_state_version(instance.user_id))
@@ -0,0 +1,34 @@
+from contextlib import contextmanager
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.middleware import get_query_budget, is_transaction_statement
+
+
+@contextmanager
+def query_budget(view_name, budget=None, using=connection):
+    if budget is None:
+        budget = get_query_budget(view_name)
+    if budget is None:
+        raise AssertionError(f'No query budget configured for {view_name}')
+    with CaptureQueriesContext(using) as context:
+        yield context
+    captured = [
+        query['sql'] for query in context.captured_queries
+        if not is_transaction_statement(query['sql'])
+    ]
+    executed = len(captured)
+    if executed > budget:
+        queries = '\n'.join(
+            f'{number}. {sql}' for number, sql in enumerate(captured, 1)
+        )
+        raise AssertionError(
+            f'{view_name}: {executed} queries executed, budget is {budget}'
+            f'\n{queries}'
+        )
+
+
+class QueryBudgetMixin:
+    def assertQueryBudget(self, view_name, budget=None):
+        return query_budget(view_name, budget)
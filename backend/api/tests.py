@@ -0,0 +1,231 @@
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from api.testing import QueryBudgetMixin
+from kitchen.cart import add_recipes_to_cart
+from kitchen.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, Tag)
+from users.models import Follow, User
+
+RECIPES = 50
+
+
+class QueryBudgetTestCase(QueryBudgetMixin, APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.tags = Tag.objects.bulk_create(
+            Tag(name=slug, color=color, slug=slug)
+            for slug, color in (
+                ('breakfast', '#E26C2D'),
+                ('lunch', '#49B64E'),
+                ('dinner', '#8775D2'),
+            )
+        )
+        cls.ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'ингредиент {number}', measurement_unit='г')
+            for number in range(10)
+        )
+        cls.authors = [
+            cls.create_user(f'author{number}') for number in range(5)
+        ]
+        cls.reader = cls.create_user('reader')
+        cls.recipes = Recipe.objects.bulk_create(
+            Recipe(
+                author=cls.authors[number % len(cls.authors)],
+                name=f'Рецепт {number}',
+                image='pictures/recipe.png',
+                text='Описание',
+                cooking_time=10
+            )
+            for number in range(RECIPES)
+        )
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe_id=recipe.id, tag_id=tag.id)
+            for number, recipe in enumerate(cls.recipes)
+            for tag in (cls.tags[number % 3], cls.tags[(number + 1) % 3])
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=recipe,
+                name=cls.ingredients[(number + shift) % 10],
+                amount=shift + 1
+            )
+            for number, recipe in enumerate(cls.recipes)
+            for shift in range(5)
+        )
+        Follow.objects.bulk_create(
+            Follow(user=cls.reader, author=author)
+            for author in cls.authors[:3]
+        )
+        recipe_ids = [recipe.id for recipe in cls.recipes[:10]]
+        Favorite.objects.bulk_create(
+            Favorite(user=cls.reader, recipe_id=recipe_id)
+            for recipe_id in recipe_ids
+        )
+        ShoppingCart.objects.bulk_create(
+            ShoppingCart(user=cls.reader, recipe_id=recipe_id)
+            for recipe_id in recipe_ids
+        )
+        add_recipes_to_cart(cls.reader.id, recipe_ids)
+        cls.token = Token.objects.create(user=cls.reader)
+
+    def setUp(self):
+        cache.clear()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    @staticmethod
+    def create_user(username):
+        return User.objects.create_user(
+            email=f'{username}@example.com',
+            username=username,
+            first_name=username,
+            last_name=username,
+            password='password'
+        )
+
+    def assertWithinBudget(self, view_name, method, url, data=None):
+        with self.assertQueryBudget(view_name):
+            response = getattr(self.client, method)(url, data, format='json')
+        self.assertLess(response.status_code, 400, view_name)
+        self.assertLessEqual(
+            int(response['X-DB-Queries']),
+            settings.QUERY_BUDGETS[view_name],
+            view_name
+        )
+        return response
+
+
+class TagQueryBudgetTests(QueryBudgetTestCase):
+    def test_list(self):
+        self.assertWithinBudget('TagViewSet.list', 'get', '/api/tags/')
+
+    def test_retrieve(self):
+        self.assertWithinBudget(
+            'TagViewSet.retrieve', 'get', f'/api/tags/{self.tags[0].id}/'
+        )
+
+
+class IngredientQueryBudgetTests(QueryBudgetTestCase):
+    def test_list(self):
+        self.assertWithinBudget(
+            'IngredientViewSet.list', 'get', '/api/ingredients/'
+        )
+
+    def test_search(self):
+        self.assertWithinBudget(
+            'IngredientViewSet.list', 'get', '/api/ingredients/?name=ингр'
+        )
+
+    def test_retrieve(self):
+        self.assertWithinBudget(
+            'IngredientViewSet.retrieve',
+            'get',
+            f'/api/ingredients/{self.ingredients[0].id}/'
+        )
+
+
+class RecipeQueryBudgetTests(QueryBudgetTestCase):
+    def test_list(self):
+        for query in (
+            f'limit={RECIPES}',
+            f'limit={RECIPES}&tags=breakfast&tags=lunch',
+            f'limit={RECIPES}&is_favorited=1&is_in_shopping_cart=1',
+            f'limit={RECIPES}&author={self.authors[0].id}',
+            f'limit={RECIPES}&ordering=popular',
+            f'limit={RECIPES}&cursor=',
+        ):
+            with self.subTest(query=query):
+                cache.clear()
+                self.assertWithinBudget(
+                    'RecipeViewSet.list', 'get', f'/api/recipes/?{query}'
+                )
+
+    def test_retrieve(self):
+        self.assertWithinBudget(
+            'RecipeViewSet.retrieve',
+            'get',
+            f'/api/recipes/{self.recipes[0].id}/'
+        )
+
+    def test_favorite(self):
+        url = f'/api/recipes/{self.recipes[-1].id}/favorite/'
+        self.assertWithinBudget('RecipeViewSet.favorite', 'post', url)
+        self.assertWithinBudget('RecipeViewSet.favorite', 'delete', url)
+
+    def test_shopping_cart(self):
+        url = f'/api/recipes/{self.recipes[-1].id}/shopping_cart/'
+        self.assertWithinBudget('RecipeViewSet.shopping_cart', 'post', url)
+        self.assertWithinBudget('RecipeViewSet.shopping_cart', 'delete', url)
+
+    def test_bulk(self):
+        data = {'recipes': [recipe.id for recipe in self.recipes]}
+        for action, url in (
+            ('RecipeViewSet.bulk_favorite', '/api/recipes/bulk/favorite/'),
+            (
+                'RecipeViewSet.bulk_shopping_cart',
+                '/api/recipes/bulk/shopping_cart/'
+            ),
+        ):
+            with self.subTest(action=action):
+                self.assertWithinBudget(action, 'post', url, data)
+                self.assertWithinBudget(action, 'delete', url, data)
+
+    def test_cart_summary(self):
+        self.assertWithinBudget(
+            'RecipeViewSet.cart_summary', 'get', '/api/recipes/cart_summary/'
+        )
+
+    def test_download_shopping_cart(self):
+        self.assertWithinBudget(
+            'RecipeViewSet.download_shopping_cart',
+            'get',
+            '/api/recipes/download_shopping_cart/'
+        )
+
+    def test_match(self):
+        ids = ','.join(
+            str(ingredient.id) for ingredient in self.ingredients[:3]
+        )
+        self.assertWithinBudget(
+            'RecipeViewSet.match',
+            'get',
+            f'/api/recipes/match/?ingredients={ids}&limit={RECIPES}'
+        )
+
+    def test_feed(self):
+        self.assertWithinBudget(
+            'RecipeViewSet.feed', 'get', f'/api/recipes/feed/?limit={RECIPES}'
+        )
+
+
+class UserQueryBudgetTests(QueryBudgetTestCase):
+    def test_list(self):
+        self.assertWithinBudget(
+            'CustomUserViewSet.list', 'get', '/api/users/'
+        )
+
+    def test_retrieve(self):
+        self.assertWithinBudget(
+            'CustomUserViewSet.retrieve',
+            'get',
+            f'/api/users/{self.authors[0].id}/'
+        )
+
+    def test_me(self):
+        self.assertWithinBudget(
+            'CustomUserViewSet.me', 'get', '/api/users/me/'
+        )
+
+    def test_subscribe(self):
+        url = f'/api/users/{self.authors[-1].id}/subscribe/'
+        self.assertWithinBudget('CustomUserViewSet.subscribe', 'post', url)
+        self.assertWithinBudget('CustomUserViewSet.subscribe', 'delete', url)
+
+    def test_subscriptions(self):
+        self.assertWithinBudget(
+            'CustomUserViewSet.subscriptions',
+            'get',
+            '/api/users/subscriptions/?recipes_limit=3'
+        )
@@ -1,6 +1,11 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
+from api.async_views import (
+    IngredientDetailView, IngredientListView, RecipeDetailView,
+    RecipeListView, SubscriptionsView, TagDetailView, TagListView
+)
 from api.views import IngredientViewSet, RecipeViewSet, TagViewSet
 from api.views import CustomUserViewSet
 
@@ -15,3 +20,15 @@ urlpatterns = [
     path('auth/', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
 ]
+
+if settings.ASYNC_READ_VIEWS:
+    urlpatterns = [
+        path('tags/', TagListView.as_view()),
+        path('tags/<int:pk>/', TagDetailView.as_view()),
+        path('ingredients/', IngredientListView.as_view()),
+        path('ingredients/<int:pk>/', IngredientDetailView.as_view()),
+        path('recipes/', RecipeListView.as_view()),
+        path('recipes/<int:pk>/', RecipeDetailView.as_view()),
+        path('users/subscriptions/', SubscriptionsView.as_view()),
+        *urlpatterns,
+    ]
@@ -1,57 +1,118 @@
-from datetime import datetime
-
-from django.db.models import Exists, OuterRef, Sum
-from django.http import HttpResponse
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Value
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 from rest_framework import status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import SAFE_METHODS, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
 from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 
-from api.pagination import LimitPageNumberPagination
+from api.cache import cache_anonymous_response, get_precomputed_response
+from api.conditional import (conditional_recipe_response, recipe_validators,
+                             user_state_version)
+from api.exports import SHOPPING_LIST_EXPORTS, shopping_list_etag
+from api.filters import POPULAR_ORDERING, RecipeFilter
+from api.pagination import (CachedCountPagination, KeysetPagination,
+                            LimitPageNumberPagination)
 from api.permissions import IsAuthorOrAdminOrReadOnly
-from api.filters import RecipeFilter, SearchFilter
+from api.search import get_ingredient_index, match_recipes
+from api.signals import bump_on_commit
 from api.serializers import (
     IngredientSerializer, RecipeCUDSerializer, FollowCreateSerializer,
     TagSerializer, FollowSerializer, RecipeSerializer, ShoppingCartSerializer,
-    FavoriteSerializer, RecipeInFollowSerializer
+    FavoriteSerializer, RecipeInFollowSerializer, ShoppingCartTotalSerializer,
+    RecipeMatchSerializer, RecipeIdsSerializer, COUNTER_FIELDS,
+    SELF_FOLLOW_MESSAGE,
+    get_recipes_limit, limited_recipes_prefetch, recipe_ingredients_prefetch
 )
-from kitchen.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                            ShoppingCart, Tag)
+from kitchen.cart import (add_recipes_to_cart, drop_recipe_from_carts,
+                          remove_recipes_from_cart)
+from kitchen.counters import adjust_counters
+from kitchen.feed import feed_recipe_ids, follow_changed
+from kitchen.models import (Favorite, Ingredient, Recipe, ShoppingCart,
+                            ShoppingCartTotal, Tag)
+from kitchen.relations import (delete_relations, insert_relation,
+                               insert_relations)
 from users.models import User, Follow
 
 
-class TagViewSet(ReadOnlyModelViewSet):
+class PrecomputedListMixin:
+    precomputed_version = None
+
+    def list(self, request, *args, **kwargs):
+        if request.accepted_renderer.format != 'json':
+            return super().list(request, *args, **kwargs)
+        return get_precomputed_response(
+            self.precomputed_version,
+            lambda: self.get_serializer(self.get_queryset(), many=True).data
+        ).serve(request)
+
+
+class TagViewSet(PrecomputedListMixin, ReadOnlyModelViewSet):
     serializer_class = TagSerializer
     queryset = Tag.objects.all()
+    precomputed_version = 'tags'
 
 
-class IngredientViewSet(ReadOnlyModelViewSet):
+class IngredientViewSet(PrecomputedListMixin, ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
-    filter_backends = (SearchFilter,)
-    search_fields = ('name', )
+    precomputed_version = 'ingredients'
+
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if name:
+            return Response(get_ingredient_index().search(
+                name, settings.INGREDIENT_SEARCH_LIMIT
+            ))
+        return super().list(request, *args, **kwargs)
 
 
 class RecipeViewSet(ModelViewSet):
     permission_classes = (IsAuthorOrAdminOrReadOnly,)
-    pagination_class = LimitPageNumberPagination
+    pagination_class = CachedCountPagination
+    count_cache_version = 'recipes'
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
 
+    @property
+    def cursor_ordering(self):
+        if self.request.query_params.get('ordering') == 'popular':
+            return POPULAR_ORDERING
+        return KeysetPagination.ordering
+
     def get_serializer_class(self):
         if self.request.method in SAFE_METHODS:
             return RecipeSerializer
         return RecipeCUDSerializer
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        user = self.request.user
+        if self.request.method in SAFE_METHODS and user.is_authenticated:
+            context['followed_ids'] = set(
+                user.follows.values_list('author_id', flat=True)
+            )
+        return context
+
     def get_queryset(self):
         user = self.request.user
-        main_query = Recipe.objects.all().prefetch_related(
-            'tags'
+        main_query = Recipe.objects.defer('search_document').prefetch_related(
+            'tags',
+            recipe_ingredients_prefetch()
         ).select_related('author')
+        if self.request.method not in SAFE_METHODS:
+            # Счётчики меняются только через F(): полное сохранение рецепта
+            # не должно перезаписывать их устаревшими значениями.
+            main_query = main_query.defer(*COUNTER_FIELDS)
         if user.is_authenticated:
             favorite = user.favorites.filter(recipe=OuterRef('pk'))
             shopping_cart = user.shopping_carts.filter(recipe=OuterRef('pk'))
@@ -61,37 +122,154 @@ class RecipeViewSet(ModelViewSet):
             )
         return main_query
 
+    def get_list_validators(self, request):
+        # Любое изменение, влияющее на списки рецептов, меняет версию
+        # 'recipes', поэтому валидаторы списка не требуют запросов к БД.
+        return recipe_validators(
+            request,
+            parts=sorted(request.query_params.lists()),
+            version_names=('recipes',)
+        )
+
+    def get_detail_validators(self, request):
+        pk = self.kwargs['pk']
+        if not (pk.isdecimal() and pk.isascii()):
+            return None
+        updated_at = Recipe.objects.filter(
+            pk=pk
+        ).values_list('updated_at', flat=True).first()
+        if updated_at is None:
+            return None
+        return recipe_validators(request, updated_at, parts=(pk,))
+
+    @conditional_recipe_response(get_list_validators)
+    @cache_anonymous_response('recipes')
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional_recipe_response(get_detail_validators)
+    @cache_anonymous_response('recipes')
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
     @action(detail=True, methods=['post', 'delete'],
             permission_classes=[IsAuthenticated])
+    @transaction.atomic
     def favorite(self, request, pk):
         if request.method == 'POST':
-            return self.create_object(FavoriteSerializer, pk, request)
-        return self.delete_object(Favorite, request.user, pk)
+            return self.create_object(
+                FavoriteSerializer, pk, request, 'favorites_count'
+            )
+        return self.delete_object(
+            Favorite, request.user, pk, 'favorites_count'
+        )
 
     @action(detail=True, methods=['post', 'delete'],
             permission_classes=[IsAuthenticated])
+    @transaction.atomic
     def shopping_cart(self, request, pk):
         if request.method == 'POST':
-            return self.create_object(ShoppingCartSerializer, pk, request)
-        return self.delete_object(ShoppingCart, request.user, pk)
+            response = self.create_object(
+                ShoppingCartSerializer, pk, request, 'in_carts_count'
+            )
+            add_recipes_to_cart(request.user.id, [pk])
+            return response
+        response = self.delete_object(
+            ShoppingCart, request.user, pk, 'in_carts_count'
+        )
+        if response.status_code == status.HTTP_204_NO_CONTENT:
+            remove_recipes_from_cart(request.user.id, [pk])
+        return response
+
+    @action(detail=False, methods=['post', 'delete'],
+            url_path='bulk/favorite', permission_classes=[IsAuthenticated])
+    @transaction.atomic
+    def bulk_favorite(self, request):
+        return self.bulk_change(request, Favorite, 'favorites_count')
+
+    @action(detail=False, methods=['post', 'delete'],
+            url_path='bulk/shopping_cart',
+            permission_classes=[IsAuthenticated])
+    @transaction.atomic
+    def bulk_shopping_cart(self, request):
+        return self.bulk_change(request, ShoppingCart, 'in_carts_count')
 
     @staticmethod
-    def create_object(serializer, pk, request):
-        recipe = get_object_or_404(Recipe, id=pk)
-        data = {
-            'user': request.user.id,
-            'recipe': recipe.id
-        }
-        serializer = serializer(data=data, context={'request': request})
+    def bulk_change(request, model, counter):
+        serializer = RecipeIdsSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
-        short_serializer = RecipeInFollowSerializer(recipe)
+        recipe_ids = list(dict.fromkeys(serializer.validated_data['recipes']))
+        user = request.user
+        if request.method == 'POST':
+            found = set(Recipe.objects.filter(
+                pk__in=recipe_ids
+            ).values_list('id', flat=True))
+            created = set(insert_relations(
+                model, 'recipe', user.id, recipe_ids
+            ))
+            changed = [
+                recipe_id for recipe_id in recipe_ids if recipe_id in created
+            ]
+            statuses = {recipe_id: 'not_found' for recipe_id in recipe_ids}
+            statuses.update(dict.fromkeys(found, 'exists'))
+            statuses.update(dict.fromkeys(changed, 'created'))
+        else:
+            deleted = set(delete_relations(
+                model, 'recipe', user.id, recipe_ids
+            ))
+            changed = [
+                recipe_id for recipe_id in recipe_ids if recipe_id in deleted
+            ]
+            statuses = {recipe_id: 'absent' for recipe_id in recipe_ids}
+            statuses.update(dict.fromkeys(changed, 'deleted'))
+        if changed:
+            delta = 1 if request.method == 'POST' else -1
+            adjust_counters(Recipe, changed, **{counter: delta})
+            if model is ShoppingCart:
+                update_cart = (
+                    add_recipes_to_cart if delta > 0
+                    else remove_recipes_from_cart
+                )
+                update_cart(user.id, changed)
+            bump_on_commit(user_state_version(user.id))
+        return Response({'results': [
+            {'id': recipe_id, 'status': statuses[recipe_id]}
+            for recipe_id in recipe_ids
+        ]})
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        drop_recipe_from_carts(instance.id)
+        adjust_counters(User, [instance.author_id], recipes_count=-1)
+        instance.delete()
+
+    @staticmethod
+    def create_object(serializer, pk, request, counter):
+        if not (pk.isdecimal() and pk.isascii()):
+            raise Http404
+        created = insert_relation(
+            serializer.Meta.model, 'recipe', request.user.id, pk
+        )
+        recipe = Recipe.objects.filter(pk=pk).values(
+            *RecipeInFollowSerializer.Meta.fields
+        ).first()
+        if recipe is None:
+            raise Http404
+        if not created:
+            raise ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [
+                serializer.Meta.validators[0].message
+            ]})
+        adjust_counters(Recipe, [pk], **{counter: 1})
+        # Вставка идёт мимо сигналов, поэтому версия меняется явно.
+        bump_on_commit(user_state_version(request.user.id))
+        short_serializer = RecipeInFollowSerializer(Recipe(**recipe))
         return Response(short_serializer.data, status=status.HTTP_201_CREATED)
 
     @staticmethod
-    def delete_object(model, user, pk):
+    def delete_object(model, user, pk, counter):
         obj = model.objects.filter(user=user, recipe__id=pk)
         if obj.delete()[0]:
+            adjust_counters(Recipe, [pk], **{counter: -1})
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response({'errors': 'Рецепт уже удален!'},
                         status=status.HTTP_400_BAD_REQUEST)
@@ -99,25 +277,130 @@ class RecipeViewSet(ModelViewSet):
     @action(detail=False, methods=['get'],
             permission_classes=(IsAuthenticated,))
     def download_shopping_cart(self, request, **kwargs):
-        ingredients = (
-            RecipeIngredient.objects
-            .filter(recipe__buyers__user=request.user)
-            .values('name')
-            .annotate(total_amount=Sum('amount'))
-            .values_list('name__name', 'total_amount',
-                         'name__measurement_unit')
+        export_format = request.query_params.get('type', 'txt')
+        if export_format not in SHOPPING_LIST_EXPORTS:
+            return Response(
+                {'errors': 'Доступные форматы: '
+                 + ', '.join(SHOPPING_LIST_EXPORTS)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        totals = self.get_cart_totals(request.user)
+        etag = shopping_list_etag(
+            export_format,
+            totals.order_by('ingredient').values_list('ingredient', 'amount')
         )
-        file_list = []
-        [file_list.append(
-            '{}. {} - {}{}.'.format(count, *ingredient))
-            for count, ingredient in enumerate(ingredients, 1)]
-        return HttpResponse(f'Cписок покупок на {datetime.now().date()}:\n'
-                            + '\n'.join(file_list),
-                            content_type='attachment/pdf')
+        response = get_conditional_response(request, etag=etag)
+        if response is not None:
+            return response
+        export, content_type = SHOPPING_LIST_EXPORTS[export_format]
+        response = StreamingHttpResponse(
+            export(totals.values_list(
+                'ingredient__name', 'amount', 'ingredient__measurement_unit'
+            ).iterator()),
+            content_type=content_type
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_list.{export_format}"'
+        )
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+    @action(detail=False, methods=['get'],
+            permission_classes=(IsAuthenticated,))
+    def cart_summary(self, request):
+        serializer = ShoppingCartTotalSerializer(
+            self.get_cart_totals(request.user).select_related('ingredient'),
+            many=True
+        )
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['get'])
+    def match(self, request):
+        have = self.get_id_list(request, 'ingredients')
+        if not have:
+            return Response(
+                {'errors': 'Укажите id ингредиентов в параметре ingredients'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        page_size = self.paginator.get_page_size(request)
+        page = request.query_params.get('page', '')
+        page = (
+            int(page) if page.isdecimal() and page.isascii() and int(page) > 0
+            else 1
+        )
+        total, matches = match_recipes(
+            have,
+            self.get_id_list(request, 'exclude'),
+            (page - 1) * page_size,
+            page_size
+        )
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, missing in matches]
+        )
+        results = []
+        for recipe_id, missing in matches:
+            # Рецепт мог быть удалён после обновления индекса.
+            if recipe_id in recipes:
+                recipes[recipe_id].missing_count = missing
+                results.append(recipes[recipe_id])
+        url = request.build_absolute_uri()
+        return Response({
+            'count': total,
+            'next': replace_query_param(url, 'page', page + 1)
+            if page * page_size < total else None,
+            'previous': replace_query_param(url, 'page', page - 1)
+            if page > 1 else None,
+            'results': RecipeMatchSerializer(
+                results, many=True, context=self.get_serializer_context()
+            ).data
+        })
+
+    @action(detail=False, methods=['get'],
+            permission_classes=(IsAuthenticated,))
+    def feed(self, request):
+        paginator = KeysetPagination()
+        page = paginator.paginate_positions(self.get_feed_page, request)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    def get_feed_page(self, position, limit):
+        recipe_ids = feed_recipe_ids(self.request.user.id, position, limit)
+        recipes = self.get_queryset().in_bulk(recipe_ids)
+        return [
+            recipes[recipe_id] for recipe_id in recipe_ids
+            if recipe_id in recipes
+        ]
+
+    @staticmethod
+    def get_id_list(request, name):
+        return [
+            int(value)
+            for values in request.query_params.getlist(name)
+            for value in values.split(',')
+            if value.isascii() and value.strip().isdecimal()
+        ]
+
+    @staticmethod
+    def get_cart_totals(user):
+        return ShoppingCartTotal.objects.filter(
+            user=user,
+            amount__gt=0
+        ).order_by('ingredient__name')
 
 
 class CustomUserViewSet(UserViewSet):
     pagination_class = LimitPageNumberPagination
+    cursor_ordering = ('username', 'id')
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        user = self.request.user
+        if user.is_authenticated:
+            return queryset.annotate(is_subscribed=Exists(
+                user.follows.filter(author=OuterRef('pk'))
+            ))
+        return queryset
 
     def get_permissions(self):
         if self.action == 'me':
@@ -129,41 +412,66 @@ class CustomUserViewSet(UserViewSet):
         permission_classes=(IsAuthenticated,),
         methods=['POST', 'DELETE']
     )
+    @transaction.atomic
     def subscribe(self, request, id):
         user = self.request.user
-        author = get_object_or_404(User, id=id)
         if request.method == 'POST':
-            serializer = FollowCreateSerializer(
-                data={
-                    'user': user.id,
-                    'author': author.id
-                },
-            )
-            serializer.is_valid(raise_exception=True)
-            serializer.save()
-            user_serializer = FollowSerializer(
-                author,
-                context={'request': request}
-            )
-            return Response(
-                user_serializer.data,
-                status=status.HTTP_201_CREATED
-            )
+            return self.follow(request, id)
+        author = get_object_or_404(User, id=id)
         unfollow = Follow.objects.filter(user=user, author=author).delete()
         if unfollow[0]:
+            adjust_counters(User, [author.id], followers_count=-1)
+            follow_changed(user.id, author.id, followed=False)
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response(
             {'errors': 'Вы не подписаны на данного пользователя'},
             status=status.HTTP_400_BAD_REQUEST
         )
 
+    @staticmethod
+    def follow(request, author_id):
+        user = request.user
+        if not (author_id.isdecimal() and author_id.isascii()):
+            raise Http404
+        if int(author_id) == user.id:
+            raise ValidationError(
+                {api_settings.NON_FIELD_ERRORS_KEY: [SELF_FOLLOW_MESSAGE]}
+            )
+        created = insert_relation(Follow, 'author', user.id, author_id)
+        author = User.objects.filter(pk=author_id).values(
+            'id', 'email', 'username', 'first_name', 'last_name',
+            'recipes_count', 'followers_count'
+        ).first()
+        if author is None:
+            raise Http404
+        if not created:
+            raise ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [
+                FollowCreateSerializer.Meta.validators[0].message
+            ]})
+        author = User(**author)
+        adjust_counters(User, [author.id], followers_count=1)
+        follow_changed(user.id, author.id, followed=True)
+        bump_on_commit(user_state_version(user.id))
+        author.followers_count += 1
+        author.is_subscribed = True
+        return Response(
+            FollowSerializer(author, context={'request': request}).data,
+            status=status.HTTP_201_CREATED
+        )
+
     @action(
         detail=False,
         permission_classes=[IsAuthenticated],
         methods=['GET']
     )
     def subscriptions(self, request):
-        queryset = User.objects.filter(followers__user=request.user)
+        queryset = User.objects.filter(
+            followers__user=request.user
+        ).annotate(
+            is_subscribed=Value(True)
+        ).order_by('username').prefetch_related(
+            limited_recipes_prefetch(get_recipes_limit(request))
+        )
         pages = self.paginate_queryset(queryset)
         serializer = FollowSerializer(
             pages,
@@ -39,6 +39,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "api.middleware.QueryBudgetMiddleware",
 ]
 
 ROOT_URLCONF = "cook.urls"
@@ -72,6 +73,16 @@ DATABASES = {
     }
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'foodgram'),
+    }
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
@@ -121,7 +132,7 @@ REST_FRAMEWORK = {
         "django_filters.rest_framework.DjangoFilterBackend"
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.AsyncTokenAuthentication',
     ],
     'SEARCH_PARAM': 'name',
 }
@@ -155,3 +166,68 @@ LENGTH_LIMITS = {
 }
 
 PAGE_SIZE = 6
+
+INGREDIENT_SEARCH_LIMIT = 50
+
+BULK_RECIPES_LIMIT = 100
+
+RECIPE_MATCH_LOG_TIMEOUT = 24 * 60 * 60
+
+SEARCH_CONFIG = 'russian'
+
+ANONYMOUS_CACHE_TIMEOUT = 5 * 60
+
+COUNT_CACHE_TIMEOUT = 10 * 60
+
+APPROXIMATE_COUNT_THRESHOLD = 100_000
+
+RECIPE_IMAGE_VARIANTS = {
+    'card': {'size': (480, 480), 'format': 'JPEG'},
+    'detail': {'size': (1200, 1200), 'format': 'JPEG'},
+    'webp': {'size': (1200, 1200), 'format': 'WEBP'},
+}
+
+IMAGE_QUALITY = 85
+
+MAX_IMAGE_BYTES = 10 * 1024 * 1024
+
+MAX_IMAGE_PIXELS = 40_000_000
+
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+
+SHOPPING_LIST_FONT = os.getenv(
+    'SHOPPING_LIST_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
+# Асинхронные представления для чтения подключаются только в ASGI-сервисе:
+# под WSGI каждое из них выполнялось бы в отдельном цикле событий.
+ASYNC_READ_VIEWS = os.getenv('ASYNC_READ_VIEWS') == 'True'
+
+# Ленту читателя, подписанного больше чем на столько авторов, заполняют
+# при публикации рецептов в таблицу FeedEntry. None отключает таблицу.
+FEED_FANOUT_THRESHOLD = None
+
+BENCHMARK_THRESHOLD = 20
+
+QUERY_BUDGETS = {
+    'RecipeViewSet.list': 7,
+    'RecipeViewSet.retrieve': 6,
+    'RecipeViewSet.favorite': 5,
+    'RecipeViewSet.shopping_cart': 8,
+    'RecipeViewSet.bulk_favorite': 7,
+    'RecipeViewSet.bulk_shopping_cart': 10,
+    'RecipeViewSet.cart_summary': 2,
+    'RecipeViewSet.match': 6,
+    'RecipeViewSet.feed': 7,
+    'RecipeViewSet.download_shopping_cart': 2,
+    'TagViewSet.list': 2,
+    'TagViewSet.retrieve': 2,
+    'IngredientViewSet.list': 2,
+    'IngredientViewSet.retrieve': 2,
+    'CustomUserViewSet.list': 3,
+    'CustomUserViewSet.retrieve': 2,
+    'CustomUserViewSet.me': 1,
+    'CustomUserViewSet.subscribe': 9,
+    'CustomUserViewSet.subscriptions': 4,
+}
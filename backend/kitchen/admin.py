@@ -2,6 +2,7 @@ from django.contrib import admin
 
 from .models import (Favorite, Ingredient, Recipe, RecipeIngredient,
                      ShoppingCart, Tag)
+from .search import update_search_documents
 
 
 class IngredientAdmin(admin.ModelAdmin):
@@ -24,7 +25,8 @@ class RecipeIngredientInline(admin.TabularInline):
 
 class RecipeAdmin(admin.ModelAdmin):
     list_display = [
-        field.name for field in Recipe._meta.fields if field.name != 'id'
+        field.name for field in Recipe._meta.fields
+        if field.name not in ('id', 'image_variants', 'search_document')
     ]
     search_fields = [
         field.name for field in Recipe._meta.fields if field.name != 'id'
@@ -34,6 +36,10 @@ class RecipeAdmin(admin.ModelAdmin):
     inlines = [RecipeIngredientInline, ]
     empty_value_display = '-пусто-'
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        update_search_documents([form.instance.id])
+
 
 class FavoriteAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'recipe')
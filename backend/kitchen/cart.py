@@ -0,0 +1,109 @@
+from django.db.models import Case, F, Sum, Value, When
+
+from kitchen.models import RecipeIngredient, ShoppingCart, ShoppingCartTotal
+
+
+def recipe_amounts(recipe_ids):
+    return dict(
+        RecipeIngredient.objects
+        .filter(recipe_id__in=recipe_ids)
+        .order_by()
+        .values('name')
+        .annotate(total_amount=Sum('amount'))
+        .values_list('name', 'total_amount')
+    )
+
+
+def apply_deltas(user_ids, deltas):
+    # Строки с нулевым количеством не удаляются сразу: иначе параллельное
+    # добавление рецепта могло бы обновить уже удалённую строку.
+    # Их вычищает команда rebuildcarttotals.
+    deltas = {
+        ingredient: delta for ingredient, delta in deltas.items() if delta
+    }
+    if not user_ids or not deltas:
+        return
+    ShoppingCartTotal.objects.bulk_create(
+        (
+            ShoppingCartTotal(user_id=user_id, ingredient_id=ingredient)
+            for user_id in user_ids
+            for ingredient, delta in deltas.items()
+            if delta > 0
+        ),
+        ignore_conflicts=True
+    )
+    ShoppingCartTotal.objects.filter(
+        user_id__in=user_ids,
+        ingredient_id__in=deltas
+    ).update(amount=F('amount') + Case(
+        *(
+            When(ingredient_id=ingredient, then=Value(delta))
+            for ingredient, delta in deltas.items()
+        ),
+        default=Value(0)
+    ))
+
+
+def add_recipes_to_cart(user_id, recipe_ids):
+    apply_deltas([user_id], recipe_amounts(recipe_ids))
+
+
+def remove_recipes_from_cart(user_id, recipe_ids):
+    apply_deltas([user_id], {
+        ingredient: -amount
+        for ingredient, amount in recipe_amounts(recipe_ids).items()
+    })
+
+
+def recipe_holders(recipe_id):
+    return list(
+        ShoppingCart.objects
+        .filter(recipe_id=recipe_id)
+        .values_list('user_id', flat=True)
+    )
+
+
+def change_recipe_in_carts(recipe_id, old_amounts, new_amounts):
+    deltas = {
+        ingredient: (
+            new_amounts.get(ingredient, 0) - old_amounts.get(ingredient, 0)
+        )
+        for ingredient in old_amounts.keys() | new_amounts.keys()
+    }
+    if any(deltas.values()):
+        apply_deltas(recipe_holders(recipe_id), deltas)
+
+
+def expected_totals(user_ids=None):
+    carts = ShoppingCart.objects.all()
+    if user_ids is not None:
+        carts = carts.filter(user_id__in=user_ids)
+    return {
+        (user_id, ingredient): amount
+        for user_id, ingredient, amount in (
+            carts
+            .order_by()
+            .values('user', 'recipe__recipeingredients__name')
+            .annotate(total_amount=Sum('recipe__recipeingredients__amount'))
+            .filter(total_amount__gt=0)
+            .values_list(
+                'user', 'recipe__recipeingredients__name', 'total_amount'
+            )
+        )
+    }
+
+
+def stored_totals(user_ids=None):
+    totals = ShoppingCartTotal.objects.filter(amount__gt=0)
+    if user_ids is not None:
+        totals = totals.filter(user_id__in=user_ids)
+    return {
+        (user_id, ingredient): amount
+        for user_id, ingredient, amount in totals.values_list(
+            'user', 'ingredient', 'amount'
+        )
+    }
+
+
+def drop_recipe_from_carts(recipe_id):
+    change_recipe_in_carts(recipe_id, recipe_amounts([recipe_id]), {})
@@ -0,0 +1,56 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from kitchen.models import Favorite, Recipe, ShoppingCart
+from users.models import Follow, User
+
+# Модель со счётчиком, поле счётчика, модель строк и поле связи с ней.
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'in_carts_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Follow, 'author'),
+)
+
+
+def adjust_counters(model, pks, **deltas):
+    # Кэш и ETag не сбрасываются: счётчики в выдаче могут отставать
+    # на ANONYMOUS_CACHE_TIMEOUT.
+    model.objects.filter(pk__in=pks).update(**{
+        field: F(field) + delta for field, delta in deltas.items()
+    })
+
+
+def actual_count(rows_model, relation):
+    return Coalesce(Subquery(
+        rows_model.objects
+        .filter(**{relation: OuterRef('pk')})
+        .order_by()
+        .values(relation)
+        .annotate(total=Count('pk'))
+        .values('total')
+    ), 0)
+
+
+def counter_drift():
+    return {
+        f'{model.__name__}.{field}': (
+            model.objects
+            .annotate(actual=actual_count(rows_model, relation))
+            .exclude(**{field: F('actual')})
+            .count()
+        )
+        for model, field, rows_model, relation in COUNTERS
+    }
+
+
+def reconcile_counters():
+    return {
+        f'{model.__name__}.{field}': (
+            model.objects
+            .annotate(actual=actual_count(rows_model, relation))
+            .exclude(**{field: F('actual')})
+            .update(**{field: actual_count(rows_model, relation)})
+        )
+        for model, field, rows_model, relation in COUNTERS
+    }
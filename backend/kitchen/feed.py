@@ -0,0 +1,143 @@
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, Q
+
+from kitchen.models import FeedEntry, Recipe
+from users.models import Follow
+
+# Каждый автор отдаёт не больше limit своих новых рецептов по индексу
+# (author, -pub_date, -id), после чего короткие списки сливаются.
+LATERAL_FEED_SQL = '''
+    SELECT recipe.id FROM {follow} AS follow
+    CROSS JOIN LATERAL (
+        SELECT id, pub_date FROM {recipe}
+        WHERE author_id = follow.author_id {seek}
+        ORDER BY pub_date DESC, id DESC
+        LIMIT %s
+    ) AS recipe
+    WHERE follow.user_id = %s
+    ORDER BY recipe.pub_date DESC, recipe.id DESC
+    LIMIT %s
+'''
+LATERAL_SEEK_SQL = 'AND (pub_date, id) < (%s::timestamptz, %s)'
+FEED_BATCH_SIZE = 1000
+
+
+def uses_feed_table(user_id):
+    threshold = settings.FEED_FANOUT_THRESHOLD
+    return threshold is not None and Follow.objects.filter(
+        user_id=user_id
+    ).count() > threshold
+
+
+def seek_filter(id_field, pub_date, recipe_id):
+    return Q(pub_date__lt=pub_date) | Q(
+        pub_date=pub_date, **{f'{id_field}__lt': recipe_id}
+    )
+
+
+def feed_recipe_ids(user_id, position, limit):
+    if uses_feed_table(user_id):
+        entries = FeedEntry.objects.filter(user_id=user_id)
+        if position is not None:
+            entries = entries.filter(seek_filter('recipe_id', *position))
+        return list(entries.order_by(
+            '-pub_date', '-recipe_id'
+        ).values_list('recipe_id', flat=True)[:limit])
+    if connection.vendor == 'postgresql':
+        return lateral_feed_ids(user_id, position, limit)
+    recipes = Recipe.objects.filter(author__followers__user_id=user_id)
+    if position is not None:
+        recipes = recipes.filter(seek_filter('id', *position))
+    return list(recipes.order_by(
+        '-pub_date', '-id'
+    ).values_list('id', flat=True)[:limit])
+
+
+def lateral_feed_ids(user_id, position, limit):
+    sql = LATERAL_FEED_SQL.format(
+        follow=Follow._meta.db_table,
+        recipe=Recipe._meta.db_table,
+        seek=LATERAL_SEEK_SQL if position is not None else ''
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [*(position or ()), limit, user_id, limit])
+        return [recipe_id for recipe_id, in cursor.fetchall()]
+
+
+def fill_feed(user_id, author_ids):
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(user_id=user_id, recipe_id=recipe_id, pub_date=pub_date)
+            for recipe_id, pub_date in Recipe.objects.filter(
+                author_id__in=author_ids
+            ).values_list('id', 'pub_date').iterator()
+        ),
+        batch_size=FEED_BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def fan_out_recipe(recipe):
+    threshold = settings.FEED_FANOUT_THRESHOLD
+    if threshold is None:
+        return
+    readers = heavy_readers(
+        threshold,
+        Follow.objects.filter(author_id=recipe.author_id).values('user_id')
+    ).values_list('user_id', flat=True)
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(
+                user_id=user_id, recipe_id=recipe.id, pub_date=recipe.pub_date
+            )
+            for user_id in readers.iterator()
+        ),
+        batch_size=FEED_BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def follow_changed(user_id, author_id, followed):
+    threshold = settings.FEED_FANOUT_THRESHOLD
+    if threshold is None:
+        return
+    follows = Follow.objects.filter(user_id=user_id)
+    total = follows.count()
+    if total <= threshold:
+        # Читатель вернулся к сборке ленты при чтении.
+        if not followed:
+            FeedEntry.objects.filter(user_id=user_id).delete()
+    elif not followed:
+        FeedEntry.objects.filter(
+            user_id=user_id, recipe__author_id=author_id
+        ).delete()
+    elif total == threshold + 1:
+        fill_feed(user_id, follows.values('author_id'))
+    else:
+        fill_feed(user_id, [author_id])
+
+
+def heavy_readers(threshold, user_ids=None):
+    follows = Follow.objects.order_by()
+    if user_ids is not None:
+        follows = follows.filter(user_id__in=user_ids)
+    return follows.values('user_id').annotate(
+        total=Count('id')
+    ).filter(total__gt=threshold).values('user_id')
+
+
+def rebuild_feeds():
+    FeedEntry.objects.all().delete()
+    threshold = settings.FEED_FANOUT_THRESHOLD
+    if threshold is None:
+        return 0
+    user_ids = list(heavy_readers(threshold).values_list(
+        'user_id', flat=True
+    ))
+    for user_id in user_ids:
+        fill_feed(
+            user_id,
+            Follow.objects.filter(user_id=user_id).values('author_id')
+        )
+    return len(user_ids)
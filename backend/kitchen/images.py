@@ -0,0 +1,93 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils import timezone
+from PIL import Image
+
+from api.cache import bump_version
+from kitchen.models import Recipe
+
+logger = logging.getLogger(__name__)
+
+FORMAT_EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp'}
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.IMAGE_WORKERS,
+    thread_name_prefix='recipe-images'
+)
+
+
+def variant_name(image_name, variant, image_format):
+    directory, filename = os.path.split(image_name)
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(
+        directory,
+        'variants',
+        f'{stem}_{variant}.{FORMAT_EXTENSIONS[image_format]}'
+    )
+
+
+def render_variant(image, size, image_format):
+    variant = image.copy()
+    variant.thumbnail(size)
+    if image_format == 'JPEG' and variant.mode != 'RGB':
+        variant = variant.convert('RGB')
+    buffer = BytesIO()
+    variant.save(buffer, image_format, quality=settings.IMAGE_QUALITY)
+    return ContentFile(buffer.getvalue())
+
+
+def build_variants(image_name, force=False):
+    variants = {}
+    image = None
+    for variant, options in settings.RECIPE_IMAGE_VARIANTS.items():
+        name = variant_name(image_name, variant, options['format'])
+        if force:
+            default_storage.delete(name)
+        if not default_storage.exists(name):
+            if image is None:
+                with default_storage.open(image_name) as original:
+                    image = Image.open(original)
+                    image.load()
+            default_storage.save(
+                name,
+                render_variant(image, options['size'], options['format'])
+            )
+        variants[variant] = name
+    return variants
+
+
+def process_recipe_image(recipe_id, image_name, force=False):
+    try:
+        variants = build_variants(image_name, force)
+        # updated_at меняет ETag карточки, версия — кэш списков.
+        if Recipe.objects.filter(pk=recipe_id, image=image_name).update(
+            image_variants=variants, updated_at=timezone.now()
+        ):
+            bump_version('recipes')
+    except Exception:
+        logger.exception(
+            'Не удалось подготовить изображения рецепта %s', recipe_id
+        )
+        return False
+    return True
+
+
+def process_in_worker(recipe_id, image_name):
+    try:
+        process_recipe_image(recipe_id, image_name)
+    finally:
+        connection.close()
+
+
+def schedule_image_processing(recipe):
+    transaction.on_commit(partial(
+        executor.submit, process_in_worker, recipe.pk, recipe.image.name
+    ))
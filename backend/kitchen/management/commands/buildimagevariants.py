@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from kitchen.images import process_recipe_image
+from kitchen.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Подготовка уменьшенных копий изображений рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Заново построить копии всех рецептов, в том числе '
+                 'уже готовые'
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='')
+        if not options['all']:
+            recipes = recipes.filter(image_variants={})
+        processed = 0
+        for recipe_id, image_name in recipes.values_list(
+            'id', 'image'
+        ).iterator():
+            if process_recipe_image(recipe_id, image_name, options['all']):
+                processed += 1
+            else:
+                self.stderr.write(
+                    f'Рецепт {recipe_id}: не удалось подготовить изображения'
+                )
+        self.stdout.write(
+            self.style.SUCCESS(f'Обработано рецептов: {processed}')
+        )
@@ -0,0 +1,229 @@
+import io
+import random
+import time
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from PIL import Image
+
+from api.cache import bump_version
+from api.conditional import RECIPE_DEPENDENCIES
+from kitchen.models import (
+    Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingCart, Tag
+)
+from kitchen.search import update_search_documents
+from users.models import Follow, User
+
+PLACEHOLDER_IMAGE = 'pictures/generated.png'
+DEFAULT_TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+)
+WORDS = (
+    'суп', 'салат', 'пирог', 'рагу', 'каша', 'запеканка', 'паста', 'плов',
+    'котлеты', 'блины', 'омлет', 'соус', 'десерт', 'хлеб', 'жаркое',
+)
+
+
+def zipf_cum_weights(size, exponent):
+    return list(accumulate(
+        1 / rank ** exponent for rank in range(1, size + 1)
+    ))
+
+
+def sample_unique(rng, population, cum_weights, count, exclude=None):
+    # Популярные объекты выпадают чаще, поэтому число попыток ограничено:
+    # пользователь может получить чуть меньше строк, чем запрошено.
+    chosen = set()
+    for _ in range(count * 3):
+        if len(chosen) >= count:
+            break
+        value = rng.choices(population, cum_weights=cum_weights)[0]
+        if value != exclude:
+            chosen.add(value)
+    return sorted(chosen)
+
+
+class Command(BaseCommand):
+    help = 'Генерация воспроизводимого набора данных для нагрузочных тестов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--prefix', default='gen')
+        parser.add_argument('--password', default='password')
+        parser.add_argument(
+            '--ingredients-per-recipe', type=int, nargs=2, default=(3, 12)
+        )
+        parser.add_argument('--follows-per-user', type=int, default=10)
+        parser.add_argument('--favorites-per-user', type=int, default=20)
+        parser.add_argument('--carts-per-user', type=int, default=3)
+        parser.add_argument(
+            '--skew',
+            type=float,
+            default=1.1,
+            help='Показатель распределения Ципфа для популярности'
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if User.objects.filter(
+            username__startswith=options['prefix']
+        ).exists():
+            raise CommandError(
+                f'Пользователи с префиксом {options["prefix"]} уже есть, '
+                'укажите другой --prefix'
+            )
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+        if not ingredient_ids:
+            raise CommandError(
+                'Сначала загрузите ингредиенты командой loadingredients'
+            )
+        self.rng = random.Random(options['seed'])
+        self.options = options
+        self.started = time.monotonic()
+        with transaction.atomic():
+            tag_ids = self.get_tag_ids()
+            user_ids = self.create_users()
+            recipe_ids = self.create_recipes(user_ids, tag_ids, ingredient_ids)
+            self.create_relations(user_ids, recipe_ids)
+            call_command(
+                'rebuildcarttotals',
+                batch_size=options['batch_size'],
+                stdout=self.stdout
+            )
+            call_command('reconcilecounters', stdout=self.stdout)
+            call_command('rebuildfeeds', stdout=self.stdout)
+        self.save_placeholder()
+        for name in ('tags', 'recipes', 'recipe-match', RECIPE_DEPENDENCIES):
+            bump_version(name)
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.monotonic() - self.started:.1f} с'
+        ))
+
+    def report(self, message):
+        self.stdout.write(
+            f'{message} ({time.monotonic() - self.started:.1f} с)'
+        )
+
+    def bulk_create(self, model, objects):
+        created = model.objects.bulk_create(
+            objects, batch_size=self.options['batch_size']
+        )
+        return [obj.pk for obj in created]
+
+    def get_tag_ids(self):
+        if not Tag.objects.exists():
+            Tag.objects.bulk_create(
+                Tag(name=name, color=color, slug=slug)
+                for name, color, slug in DEFAULT_TAGS
+            )
+        return list(Tag.objects.values_list('id', flat=True))
+
+    def create_users(self):
+        prefix = self.options['prefix']
+        # Хэш пароля считается один раз: он самая дорогая часть User.
+        password = make_password(self.options['password'])
+        user_ids = []
+        total = self.options['users']
+        for start in range(0, total, self.options['batch_size']):
+            stop = min(start + self.options['batch_size'], total)
+            user_ids += self.bulk_create(User, [
+                User(
+                    username=f'{prefix}{number}',
+                    email=f'{prefix}{number}@example.com',
+                    first_name=f'Имя{number}',
+                    last_name=f'Фамилия{number}',
+                    password=password
+                )
+                for number in range(start, stop)
+            ])
+        self.report(f'Пользователей: {len(user_ids)}')
+        return user_ids
+
+    def create_recipes(self, user_ids, tag_ids, ingredient_ids):
+        rng = self.rng
+        authors = zipf_cum_weights(len(user_ids), self.options['skew'])
+        ingredients = zipf_cum_weights(len(ingredient_ids), 0.8)
+        low, high = self.options['ingredients_per_recipe']
+        RecipeTag = Recipe.tags.through
+        recipe_ids = []
+        total = self.options['recipes']
+        for start in range(0, total, self.options['batch_size']):
+            stop = min(start + self.options['batch_size'], total)
+            batch_ids = self.bulk_create(Recipe, [
+                Recipe(
+                    author_id=rng.choices(user_ids, cum_weights=authors)[0],
+                    name=f'{rng.choice(WORDS).capitalize()} №{number}',
+                    image=PLACEHOLDER_IMAGE,
+                    text=' '.join(rng.choices(WORDS, k=rng.randint(5, 40))),
+                    cooking_time=rng.randint(1, 180)
+                )
+                for number in range(start, stop)
+            ])
+            self.bulk_create(RecipeTag, [
+                RecipeTag(recipe_id=recipe_id, tag_id=tag_id)
+                for recipe_id in batch_ids
+                for tag_id in rng.sample(
+                    tag_ids, rng.randint(1, len(tag_ids))
+                )
+            ])
+            self.bulk_create(RecipeIngredient, [
+                RecipeIngredient(
+                    recipe_id=recipe_id,
+                    name_id=ingredient_id,
+                    amount=rng.randint(1, 500)
+                )
+                for recipe_id in batch_ids
+                for ingredient_id in sample_unique(
+                    rng, ingredient_ids, ingredients, rng.randint(low, high)
+                )
+            ])
+            update_search_documents(batch_ids)
+            recipe_ids += batch_ids
+            self.report(f'Рецептов: {len(recipe_ids)}')
+        return recipe_ids
+
+    def create_relations(self, user_ids, recipe_ids):
+        skew = self.options['skew']
+        authors = zipf_cum_weights(len(user_ids), skew)
+        recipes = zipf_cum_weights(len(recipe_ids), skew) if recipe_ids else []
+        relations = (
+            (Follow, 'author_id', user_ids, authors, 'follows_per_user'),
+            (Favorite, 'recipe_id', recipe_ids, recipes, 'favorites_per_user'),
+            (ShoppingCart, 'recipe_id', recipe_ids, recipes, 'carts_per_user'),
+        )
+        for model, field, population, cum_weights, option in relations:
+            average = self.options[option]
+            if not population or not average:
+                continue
+            created = 0
+            batch = []
+            for user_id in user_ids:
+                for value in sample_unique(
+                    self.rng,
+                    population,
+                    cum_weights,
+                    self.rng.randint(0, average * 2),
+                    exclude=user_id if model is Follow else None
+                ):
+                    batch.append(model(user_id=user_id, **{field: value}))
+                if len(batch) >= self.options['batch_size']:
+                    created += len(self.bulk_create(model, batch))
+                    batch = []
+            created += len(self.bulk_create(model, batch))
+            self.report(f'{model._meta.verbose_name_plural}: {created}')
+
+    def save_placeholder(self):
+        if default_storage.exists(PLACEHOLDER_IMAGE):
+            return
+        buffer = io.BytesIO()
+        Image.new('RGB', (600, 400), '#E26C2D').save(buffer, 'PNG')
+        default_storage.save(PLACEHOLDER_IMAGE, ContentFile(buffer.getvalue()))
@@ -1,22 +1,154 @@
 import csv
+import io
+import json
+import time
+from itertools import islice
+from pathlib import Path
 
 from django.conf import settings
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
 
+from api.cache import bump_version
 from kitchen.models import Ingredient
 
+JSON_CHUNK_SIZE = 64 * 1024
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        if row:
+            yield row[0], row[1]
+
+
+def read_json(file):
+    # Читает и массив объектов, и объекты по одному в строке,
+    # не загружая файл в память целиком.
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    eof = False
+    while True:
+        while position < len(buffer) and buffer[position] in ' \t\r\n[],':
+            position += 1
+        if position == len(buffer):
+            if eof:
+                return
+            buffer, position = file.read(JSON_CHUNK_SIZE), 0
+            eof = not buffer
+            continue
+        try:
+            item, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            chunk = file.read(JSON_CHUNK_SIZE)
+            if not chunk:
+                raise CommandError('Некорректный JSON')
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+        position = end
+        yield item['name'], item['measurement_unit']
+
+
+READERS = {'csv': read_csv, 'json': read_json}
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
 
 class Command(BaseCommand):
     help = 'Загрузка данных для модели ингредиента'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            default=settings.BASE_DIR / 'data/ingredients.csv',
+            type=Path
+        )
+        parser.add_argument(
+            '--format',
+            choices=READERS,
+            help='По умолчанию определяется по расширению файла'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000
+        )
+
     def handle(self, *args, **options):
-        with open(settings.BASE_DIR / 'data/ingredients.csv',
-                  'r', encoding='utf-8') as csv_file:
-            reader = csv.reader(csv_file)
-            ingredients = []
-            for row in reader:
-                ingredients.append(Ingredient(
-                    name=row[0],
-                    measurement_unit=row[1]
-                ))
-            Ingredient.objects.bulk_create(ingredients)
+        path = options['path']
+        file_format = options['format'] or path.suffix.lstrip('.').lower()
+        if file_format not in READERS:
+            raise CommandError(f'Неизвестный формат файла: {path}')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть не меньше 1')
+        started = time.monotonic()
+        with open(path, encoding='utf-8') as file, transaction.atomic():
+            rows = READERS[file_format](file)
+            if connection.vendor == 'postgresql':
+                processed, created = self.copy_rows(
+                    rows, options['batch_size']
+                )
+            else:
+                processed, created = self.insert_rows(
+                    rows, options['batch_size']
+                )
+        bump_version('ingredients')
+        self.stdout.write(self.style.SUCCESS(
+            f'Строк: {processed}, новых ингредиентов: {created}, '
+            f'время: {time.monotonic() - started:.2f} с'
+        ))
+
+    def report(self, processed, started):
+        self.stdout.write(
+            f'Обработано строк: {processed} '
+            f'({time.monotonic() - started:.2f} с)'
+        )
+
+    def insert_rows(self, rows, batch_size):
+        before = Ingredient.objects.count()
+        processed = 0
+        started = time.monotonic()
+        for batch in batches(rows, batch_size):
+            Ingredient.objects.bulk_create(
+                (
+                    Ingredient(name=name, measurement_unit=unit)
+                    for name, unit in batch
+                ),
+                ignore_conflicts=True
+            )
+            processed += len(batch)
+            self.report(processed, started)
+        return processed, Ingredient.objects.count() - before
+
+    def copy_rows(self, rows, batch_size):
+        table = Ingredient._meta.db_table
+        processed = 0
+        started = time.monotonic()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMPORARY TABLE ingredient_staging '
+                '(name text, measurement_unit text) ON COMMIT DROP'
+            )
+            for batch in batches(rows, batch_size):
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(batch)
+                buffer.seek(0)
+                cursor.copy_expert(
+                    'COPY ingredient_staging FROM STDIN WITH (FORMAT csv)',
+                    buffer
+                )
+                processed += len(batch)
+                self.report(processed, started)
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                'SELECT DISTINCT name, measurement_unit '
+                'FROM ingredient_staging '
+                'ON CONFLICT (name, measurement_unit) DO NOTHING'
+            )
+            created = cursor.rowcount
+        return processed, created
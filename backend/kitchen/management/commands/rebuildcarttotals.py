@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from kitchen.cart import expected_totals, stored_totals
+from kitchen.models import ShoppingCartTotal
+
+
+class Command(BaseCommand):
+    help = 'Пересборка и проверка итогов списков покупок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только сравнить итоги с корзинами, ничего не меняя'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000
+        )
+
+    def handle(self, *args, **options):
+        expected = expected_totals()
+        stored = stored_totals()
+        drift = {
+            key for key in expected.keys() | stored.keys()
+            if expected.get(key) != stored.get(key)
+        }
+        users = {user_id for user_id, ingredient in drift}
+        self.stdout.write(
+            f'Расхождений: {len(drift)} у пользователей: {len(users)}'
+        )
+        if options['check']:
+            if drift:
+                raise CommandError('Итоги списков покупок расходятся')
+            return
+        with transaction.atomic():
+            ShoppingCartTotal.objects.all().delete()
+            ShoppingCartTotal.objects.bulk_create(
+                (
+                    ShoppingCartTotal(
+                        user_id=user_id,
+                        ingredient_id=ingredient,
+                        amount=amount
+                    )
+                    for (user_id, ingredient), amount in expected.items()
+                ),
+                batch_size=options['batch_size']
+            )
+        self.stdout.write(
+            self.style.SUCCESS(f'Итогов пересобрано: {len(expected)}')
+        )
@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from kitchen.feed import rebuild_feeds
+
+
+class Command(BaseCommand):
+    help = 'Пересборка материализованных лент по FEED_FANOUT_THRESHOLD'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            readers = rebuild_feeds()
+        if settings.FEED_FANOUT_THRESHOLD is None:
+            self.stdout.write('Материализованные ленты отключены')
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'Лент пересобрано: {readers}'
+        ))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from kitchen.counters import counter_drift, reconcile_counters
+
+
+class Command(BaseCommand):
+    help = 'Проверка и исправление счётчиков избранного, корзин и подписок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только сравнить счётчики с данными, ничего не меняя'
+        )
+
+    def handle(self, *args, **options):
+        if options['check']:
+            drift = counter_drift()
+            for counter, rows in drift.items():
+                self.stdout.write(f'{counter}: расхождений {rows}')
+            if any(drift.values()):
+                raise CommandError('Счётчики расходятся с данными')
+            return
+        with transaction.atomic():
+            fixed = reconcile_counters()
+        for counter, rows in fixed.items():
+            self.stdout.write(f'{counter}: исправлено {rows}')
+        self.stdout.write(self.style.SUCCESS('Счётчики сверены'))
@@ -0,0 +1,56 @@
+# Generated by Django 4.2.3 on 2026-10-18 03:34
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+import django.db.models.deletion
+
+
+def fill_totals(apps, schema_editor):
+    ShoppingCart = apps.get_model('kitchen', 'ShoppingCart')
+    ShoppingCartTotal = apps.get_model('kitchen', 'ShoppingCartTotal')
+    totals = (
+        ShoppingCart.objects
+        .order_by()
+        .values('user', 'recipe__recipeingredients__name')
+        .annotate(total_amount=Sum('recipe__recipeingredients__amount'))
+        .filter(total_amount__gt=0)
+        .values_list('user', 'recipe__recipeingredients__name', 'total_amount')
+    )
+    ShoppingCartTotal.objects.bulk_create(
+        (
+            ShoppingCartTotal(
+                user_id=user_id, ingredient_id=ingredient_id, amount=amount
+            )
+            for user_id, ingredient_id, amount in totals.iterator()
+        ),
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('kitchen', '0002_auto_20230830_1634'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingCartTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.IntegerField(default=0)),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_cart_totals', to='kitchen.ingredient')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_cart_totals', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ('user', 'ingredient'),
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcarttotal',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='one total per cart ingredient'),
+        ),
+        migrations.RunPython(fill_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    Ingredient = apps.get_model('kitchen', 'Ingredient')
+    RecipeIngredient = apps.get_model('kitchen', 'RecipeIngredient')
+    ShoppingCartTotal = apps.get_model('kitchen', 'ShoppingCartTotal')
+    groups = (
+        Ingredient.objects
+        .order_by()
+        .values('name', 'measurement_unit')
+        .annotate(keep=Min('id'), total=Count('id'))
+        .filter(total__gt=1)
+    )
+    for group in groups.iterator():
+        duplicates = list(
+            Ingredient.objects
+            .filter(
+                name=group['name'],
+                measurement_unit=group['measurement_unit']
+            )
+            .exclude(pk=group['keep'])
+            .values_list('pk', flat=True)
+        )
+        for model, field, owner in (
+            (RecipeIngredient, 'name_id', 'recipe_id'),
+            (ShoppingCartTotal, 'ingredient_id', 'user_id'),
+        ):
+            kept = {
+                getattr(row, owner): row
+                for row in model.objects.filter(**{field: group['keep']})
+            }
+            for row in model.objects.filter(**{f'{field}__in': duplicates}):
+                if getattr(row, owner) in kept:
+                    kept_row = kept[getattr(row, owner)]
+                    kept_row.amount += row.amount
+                    kept_row.save(update_fields=['amount'])
+                    row.delete()
+                else:
+                    setattr(row, field, group['keep'])
+                    row.save(update_fields=[field])
+                    kept[getattr(row, owner)] = row
+        Ingredient.objects.filter(pk__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kitchen', '0006_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop
+        ),
+    ]
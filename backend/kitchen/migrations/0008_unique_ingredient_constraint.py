@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+# Отдельно от слияния дублей: в PostgreSQL ALTER TABLE в одной транзакции
+# с удалением строк падает на отложенных триггерах внешних ключей.
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kitchen', '0007_unique_ingredient'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(
+                fields=('name', 'measurement_unit'),
+                name='unique ingredient unit'
+            ),
+        ),
+    ]
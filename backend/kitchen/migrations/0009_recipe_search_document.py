@@ -0,0 +1,79 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations, models
+
+FTS_TABLE = 'kitchen_recipe_fts'
+
+
+def search_index():
+    return GinIndex(
+        SearchVector('name', weight='A', config='russian')
+        + SearchVector('search_document', config='russian'),
+        name='recipe_search_document_idx'
+    )
+
+
+def fill_search_documents(apps, schema_editor):
+    Recipe = apps.get_model('kitchen', 'Recipe')
+    RecipeIngredient = apps.get_model('kitchen', 'RecipeIngredient')
+    ingredients = {}
+    for recipe_id, name in RecipeIngredient.objects.order_by().values_list(
+        'recipe_id', 'name__name'
+    ).iterator():
+        ingredients.setdefault(recipe_id, []).append(name)
+    recipes = [
+        Recipe(
+            pk=recipe_id,
+            search_document='\n'.join(
+                [name, text, *ingredients.get(recipe_id, ())]
+            )
+        )
+        for recipe_id, name, text in Recipe.objects.values_list(
+            'id', 'name', 'text'
+        ).iterator()
+    ]
+    Recipe.objects.bulk_update(recipes, ['search_document'], batch_size=1000)
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        schema_editor.add_index(
+            apps.get_model('kitchen', 'Recipe'), search_index()
+        )
+    elif connection.vendor == 'sqlite':
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(name, '
+            "search_document, tokenize='unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, search_document) '
+            'SELECT id, name, search_document FROM kitchen_recipe'
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        schema_editor.remove_index(
+            apps.get_model('kitchen', 'Recipe'), search_index()
+        )
+    elif connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kitchen', '0008_unique_ingredient_constraint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_document',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(fill_search_documents, migrations.RunPython.noop),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
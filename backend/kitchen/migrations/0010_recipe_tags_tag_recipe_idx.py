@@ -0,0 +1,17 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kitchen', '0009_recipe_search_document'),
+    ]
+
+    operations = [
+        # Покрывающий индекс: фильтр по тегам читает recipe_id прямо из него.
+        migrations.RunSQL(
+            'CREATE INDEX recipe_tags_tag_recipe_idx '
+            'ON kitchen_recipe_tags (tag_id, recipe_id)',
+            'DROP INDEX recipe_tags_tag_recipe_idx'
+        ),
+    ]
@@ -0,0 +1,47 @@
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    Recipe = apps.get_model('kitchen', 'Recipe')
+    for field, rows_model in (
+        ('favorites_count', apps.get_model('kitchen', 'Favorite')),
+        ('in_carts_count', apps.get_model('kitchen', 'ShoppingCart')),
+    ):
+        Recipe.objects.update(**{field: Coalesce(Subquery(
+            rows_model.objects
+            .filter(recipe=OuterRef('pk'))
+            .order_by()
+            .values('recipe')
+            .annotate(total=Count('pk'))
+            .values('total')
+        ), 0)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kitchen', '0010_recipe_tags_tag_recipe_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='in_carts_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(
+                fields=['-favorites_count', '-pub_date', '-id'],
+                name='recipe_popular_idx'
+            ),
+        ),
+    ]
@@ -18,6 +18,12 @@ class Ingredient(models.Model):
 
     class Meta:
         ordering = ('name',)
+        constraints = (
+            models.UniqueConstraint(
+                fields=('name', 'measurement_unit'),
+                name='unique ingredient unit'
+            ),
+        )
 
 
 class Tag(models.Model):
@@ -51,6 +57,7 @@ class Recipe(models.Model):
     )
     name = models.CharField(max_length=settings.LENGTH_LIMITS['recipe_name'])
     image = models.ImageField(upload_to='pictures/')
+    image_variants = models.JSONField(default=dict, editable=False)
     text = models.TextField()
     ingredients = models.ManyToManyField(
         Ingredient,
@@ -61,12 +68,30 @@ class Recipe(models.Model):
         validators=[MinValueValidator(1)]
     )
     pub_date = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    search_document = models.TextField(blank=True, editable=False)
+    favorites_count = models.IntegerField(default=0, editable=False)
+    in_carts_count = models.IntegerField(default=0, editable=False)
 
     def __str__(self):
         return self.name
 
     class Meta:
         ordering = ('-pub_date',)
+        indexes = (
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='recipe_pub_date_id_idx'
+            ),
+            models.Index(
+                fields=('-favorites_count', '-pub_date', '-id'),
+                name='recipe_popular_idx'
+            ),
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='recipe_author_pub_date_idx'
+            ),
+        )
 
 
 class RecipeIngredient(models.Model):
@@ -132,3 +157,55 @@ class ShoppingCart(models.Model):
                 name='no double buy'
             ),
         )
+
+
+class ShoppingCartTotal(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_cart_totals'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_cart_totals'
+    )
+    amount = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ('user', 'ingredient')
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='one total per cart ingredient'
+            ),
+        )
+
+
+class FeedEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries'
+    )
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        ordering = ('user', '-pub_date', '-recipe')
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='one feed entry per recipe'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date', '-recipe'),
+                name='feed_entry_user_pub_date_idx'
+            ),
+        )
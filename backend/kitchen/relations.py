@@ -0,0 +1,49 @@
+from django.db import connections
+
+
+def insert_relations(model, field, user_id, target_ids):
+    # Строки вставляются только для существующих целей: внешние ключи
+    # отложены до конца транзакции и не остановили бы саму вставку.
+    # RETURNING отдаёт цели, связь с которыми создал именно этот запрос,
+    # поэтому параллельная вставка той же строки не посчитается дважды.
+    target = model._meta.get_field(field)
+    target_meta = target.related_model._meta
+    connection = connections[model.objects.db]
+    quote = connection.ops.quote_name
+    placeholders = ', '.join(['%s'] * len(target_ids))
+    sql = (
+        f'INSERT INTO {quote(model._meta.db_table)} '
+        f'({quote(model._meta.get_field("user").column)}, '
+        f'{quote(target.column)}) '
+        f'SELECT %s, {quote(target_meta.pk.column)} '
+        f'FROM {quote(target_meta.db_table)} '
+        f'WHERE {quote(target_meta.pk.column)} IN ({placeholders}) '
+        f'ON CONFLICT DO NOTHING RETURNING {quote(target.column)}'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, (user_id, *target_ids))
+        return [row[0] for row in cursor.fetchall()]
+
+
+def delete_relations(model, field, user_id, target_ids):
+    # Один DELETE вместо выборки объектов для сигналов: у этих моделей
+    # сигналы только меняют версию состояния пользователя, и вызывающий
+    # код делает это сам. RETURNING, как и при вставке, отдаёт только
+    # строки, удалённые именно этим запросом.
+    target = model._meta.get_field(field)
+    connection = connections[model.objects.db]
+    quote = connection.ops.quote_name
+    placeholders = ', '.join(['%s'] * len(target_ids))
+    sql = (
+        f'DELETE FROM {quote(model._meta.db_table)} '
+        f'WHERE {quote(model._meta.get_field("user").column)} = %s '
+        f'AND {quote(target.column)} IN ({placeholders}) '
+        f'RETURNING {quote(target.column)}'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, (user_id, *target_ids))
+        return [row[0] for row in cursor.fetchall()]
+
+
+def insert_relation(model, field, user_id, target_id):
+    return bool(insert_relations(model, field, user_id, [target_id]))
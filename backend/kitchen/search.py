@@ -0,0 +1,100 @@
+import re
+
+from django.conf import settings
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, SearchVector
+)
+from django.db import connection
+from django.db.models import F, Q, Value
+from django.db.models.expressions import RawSQL
+
+from kitchen.models import Recipe, RecipeIngredient
+
+FTS_TABLE = 'kitchen_recipe_fts'
+FTS_NAME_WEIGHT = 5.0
+SEARCH_TERM = re.compile(r'\w+')
+
+
+def recipe_documents(recipe_ids):
+    documents = {
+        recipe_id: [name, text]
+        for recipe_id, name, text in Recipe.objects.filter(
+            pk__in=recipe_ids
+        ).values_list('id', 'name', 'text')
+    }
+    for recipe_id, ingredient in RecipeIngredient.objects.filter(
+        recipe_id__in=recipe_ids
+    ).order_by().values_list('recipe_id', 'name__name'):
+        documents[recipe_id].append(ingredient)
+    return {
+        recipe_id: '\n'.join(parts) for recipe_id, parts in documents.items()
+    }
+
+
+def update_search_documents(recipe_ids):
+    documents = recipe_documents(recipe_ids)
+    # bulk_update не трогает updated_at: документ не виден в ответах API.
+    Recipe.objects.bulk_update(
+        [
+            Recipe(pk=recipe_id, search_document=document)
+            for recipe_id, document in documents.items()
+        ],
+        ['search_document'],
+        batch_size=1000
+    )
+    if connection.vendor == 'sqlite':
+        update_fts(documents)
+
+
+def update_fts(documents):
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+            [(recipe_id,) for recipe_id in documents]
+        )
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, search_document) '
+            'VALUES (%s, %s, %s)',
+            [
+                (recipe_id, document.partition('\n')[0], document)
+                for recipe_id, document in documents.items()
+            ]
+        )
+
+
+def search_vector():
+    # Совпадение в названии весит больше, чем в тексте и ингредиентах.
+    return SearchVector(
+        'name', weight='A', config=settings.SEARCH_CONFIG
+    ) + SearchVector('search_document', config=settings.SEARCH_CONFIG)
+
+
+def search_recipes(queryset, query):
+    terms = SEARCH_TERM.findall(query)
+    if not terms:
+        return queryset
+    if connection.vendor == 'postgresql':
+        search_query = SearchQuery(
+            query, config=settings.SEARCH_CONFIG, search_type='websearch'
+        )
+        return queryset.annotate(
+            search=search_vector(),
+            rank=SearchRank(search_vector(), search_query)
+        ).filter(search=search_query).order_by('-rank', '-pub_date', '-id')
+    if connection.vendor == 'sqlite':
+        # Каждое слово экранируется и ищется по префиксу.
+        match = ' '.join(f'"{term}"*' for term in terms)
+        return queryset.filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+            (match,)
+        )).annotate(rank=RawSQL(
+            f'SELECT bm25({FTS_TABLE}, {FTS_NAME_WEIGHT}, 1.0) '
+            f'FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s '
+            f'AND {FTS_TABLE}.rowid = {Recipe._meta.db_table}.id',
+            (match,)
+        )).order_by(F('rank').asc(), '-pub_date', '-id')
+    condition = Q()
+    for term in terms:
+        condition &= Q(search_document__icontains=term)
+    return queryset.filter(condition).annotate(rank=Value(0))
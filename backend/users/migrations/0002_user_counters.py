@@ -0,0 +1,41 @@
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    for field, rows_model in (
+        ('recipes_count', apps.get_model('kitchen', 'Recipe')),
+        ('followers_count', apps.get_model('users', 'Follow')),
+    ):
+        User.objects.update(**{field: Coalesce(Subquery(
+            rows_model.objects
+            .filter(author=OuterRef('pk'))
+            .order_by()
+            .values('author')
+            .annotate(total=Count('pk'))
+            .values('total')
+        ), 0)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+        ('kitchen', '0011_recipe_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='recipes_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='followers_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -40,6 +40,8 @@ class User(AbstractUser):
         _('password'),
         max_length=settings.LENGTH_LIMITS['user_password']
     )
+    recipes_count = models.IntegerField(default=0, editable=False)
+    followers_count = models.IntegerField(default=0, editable=False)
 
     class Meta:
         ordering = ('username',)